@@ -0,0 +1,107 @@
+import os
+import sys
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Union
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src import metrics
+
+
+class ContentCache:
+    """
+    Two-level cache of inscription contents, which never change once inscribed.
+
+    Contents are kept in memory, least recently used first out once `memory_budget` bytes
+    are used, and in a directory with one file per inscription id so they outlive the
+    process. Concurrent lookups of the same inscription share one fetch. Lookups are
+    counted in the `content_cache.memory_hits`, `content_cache.disk_hits` and
+    `content_cache.misses` metrics.
+    """
+
+    def __init__(self, directory: Union[str, None], memory_budget: int):
+        """
+        Args:
+            directory (Union[str, None]): The directory the contents are stored in, None
+                to keep them in memory only.
+            memory_budget (int): The number of content bytes kept in memory.
+        """
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.memory_size = 0
+        self.contents = OrderedDict()
+        self.loading = {}
+
+    async def get(
+        self, inscription_id: str, fetch: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """
+        Get the content of an inscription, fetching it on a miss.
+
+        Args:
+            inscription_id (str): The id of the inscription.
+            fetch (Callable[[], Awaitable[bytes]]): Fetches the content from its source.
+
+        Returns:
+            bytes: The content.
+        """
+        content = self.contents.get(inscription_id)
+        if content is not None:
+            self.contents.move_to_end(inscription_id)
+            metrics.incr("content_cache.memory_hits")
+            return content
+
+        task = self.loading.get(inscription_id)
+        if task is None:
+            task = asyncio.ensure_future(self.load(inscription_id, fetch))
+            self.loading[inscription_id] = task
+            task.add_done_callback(lambda _: self.loading.pop(inscription_id, None))
+        # a cancelled lookup leaves the fetch running for the others waiting on it
+        return await asyncio.shield(task)
+
+    async def load(
+        self, inscription_id: str, fetch: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        content = None
+        if self.directory:
+            content = await asyncio.to_thread(self.read, inscription_id)
+
+        if content is not None:
+            metrics.incr("content_cache.disk_hits")
+        else:
+            metrics.incr("content_cache.misses")
+            content = await fetch()
+            if self.directory:
+                await asyncio.to_thread(self.write, inscription_id, content)
+
+        self.remember(inscription_id, content)
+        return content
+
+    def remember(self, inscription_id: str, content: bytes):
+        if len(content) > self.memory_budget:
+            return
+        self.contents[inscription_id] = content
+        self.memory_size += len(content)
+        while self.memory_size > self.memory_budget:
+            (_, evicted) = self.contents.popitem(last=False)
+            self.memory_size -= len(evicted)
+
+    def path(self, inscription_id: str) -> str:
+        return os.path.join(self.directory, inscription_id[:2], inscription_id)
+
+    def read(self, inscription_id: str) -> Union[bytes, None]:
+        try:
+            with open(self.path(inscription_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, inscription_id: str, content: bytes):
+        path = self.path(inscription_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # written aside then renamed, so a crash never leaves a truncated content behind
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, path)
@@ -4,7 +4,7 @@ import json
 import os
 import sys
 from queue import Queue, Empty
-from typing import Union, List
+from typing import Union, Dict, List, Tuple
 
 import sqlalchemy as sa
 from aiomysql.sa import create_engine
@@ -12,16 +12,16 @@ from environs import Env
 from loguru import logger
 from sqlalchemy import func, select, text
 
-from httpx_helper import HttpNotFound
-
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
 from util import random_string
-from src import bitcoin_cli, ord_cli
+from src import bitcoin_cli, ord_cli, metrics
 from src.data.processer.interface import Interface
+from src.data.event.content_cache import ContentCache
+from src.data.event.readiness import BlockReadiness
 
 
-from src.structure import Inscription, Inscription_Transaction, Event, Brc20_Token_Ledger_Log
+from src.structure import Inscription, Inscription_Transaction, Event, EventType, Brc20_Token_Ledger_Log
 
 
 class EventIndexer:
@@ -71,6 +71,10 @@ class EventIndexer:
         )
 
         self.engine = None
+        self.pool_timeout = None
+        self.content_cache = None
+        self.orc20_inscription_keys = None
+        self.readiness = None
         self.stopped = False
         self.running = True
         self.data_processer = data_processer
@@ -79,7 +83,7 @@ class EventIndexer:
     async def init(self):
         env = Env()
         env.read_env()
-        self.engine = await create_engine(
+        connect_kwargs = dict(
             user=env.str("MYSQL_USER"),
             password=env.str("MYSQL_PASSWD"),
             db=env.str("MYSQL_DB"),
@@ -87,6 +91,61 @@ class EventIndexer:
             port=env.int("MYSQL_PORT"),
             autocommit=True
         )
+        # milliseconds, 0 disables it, only applies to SELECT statements
+        statement_timeout = env.int("MYSQL_STATEMENT_TIMEOUT", 0)
+        if statement_timeout:
+            connect_kwargs["init_command"] = f"SET SESSION max_execution_time={statement_timeout}"
+        self.pool_timeout = env.float("MYSQL_POOL_ACQUIRE_TIMEOUT", 60)
+        self.content_cache = ContentCache(
+            env.str("CONTENT_CACHE_DIR", "") or None,
+            env.int("CONTENT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024),
+        )
+        self.readiness = BlockReadiness(
+            self,
+            env.int("UPSTREAM_POLL_WINDOW", 8),
+            env.float("UPSTREAM_POLL_MIN_INTERVAL", 0.5),
+            env.float("UPSTREAM_POLL_MAX_INTERVAL", 5),
+        )
+        if env.bool("ORC20_REGISTRY_FILTER", False):
+            await self.load_orc20_inscription_keys()
+        self.engine = await create_engine(
+            minsize=env.int("MYSQL_POOL_MINSIZE", 1),
+            maxsize=env.int("MYSQL_POOL_MAXSIZE", 10),
+            **connect_kwargs
+        )
+
+    def acquire(self):
+        return metrics.pooled(
+            "mysql", self.engine.acquire, self.engine.release, self.pool_timeout
+        )
+
+    @staticmethod
+    def get_orc20_inscription_key(inscription_id: str) -> int:
+        # the leading 64 bits of the genesis txid, a shared key only lets a transfer
+        # through to the full checks
+        return int(inscription_id[:16], 16)
+
+    async def load_orc20_inscription_keys(self):
+        """
+        Load the registry of the inscriptions inscribed with an ORC-20 instruction.
+
+        Only their transfers can produce events, the others are dropped before their
+        content is read.
+        """
+        keys = set()
+        async for inscription_id in self.data_processer.get_orc20_inscription_ids():
+            keys.add(self.get_orc20_inscription_key(inscription_id))
+        self.orc20_inscription_keys = keys
+        logger.info(f"Loaded {len(keys)} orc20 inscriptions")
+
+    def is_orc20_candidate(self, inscription_transaction: Inscription_Transaction, block_inscription_ids: set) -> bool:
+        if inscription_transaction.genesis_tx or self.orc20_inscription_keys is None:
+            return True
+        inscription_id = inscription_transaction.inscription_id
+        # inscribed earlier in this block, not registered until the block is committed
+        if inscription_id in block_inscription_ids:
+            return True
+        return self.get_orc20_inscription_key(inscription_id) in self.orc20_inscription_keys
 
     @staticmethod
     def get_block_index_range(block_height: int):
@@ -108,39 +167,39 @@ class EventIndexer:
             error = f"Mysql::close: Failed close database connection {e}"
             logger.exception(error)
 
-    async def is_block_all_inscription_transactions_handled(self, block_height: int) -> bool:
+    async def get_inscription_transaction_progress(self, start_block_height: int, end_block_height: int) -> Dict[int, Tuple[int, int]]:
+        """
+        Count the handled and unhandled inscription transactions of a range of blocks in one query.
+
+        Returns:
+            Dict[int, Tuple[int, int]]: The handled and unhandled counts by block height, for
+                the blocks with inscription transactions.
+        """
         try:
-            min_block_index, max_block_index = self.get_block_index_range(block_height)
-            async with self.engine.acquire() as conn:
-                unhandled = await conn.scalar(select([func.count(self.inscription_transaction.c.id)])
-                .execution_options(autocommit=True)
-                .where(
-                    self.inscription_transaction.c.block_index >= min_block_index
-                ).where(
-                    self.inscription_transaction.c.block_index <= max_block_index
-                ).where(
-                    self.inscription_transaction.c.handled == False
-                ))
-            async with self.engine.acquire() as conn:
-                handled = await conn.scalar(select([func.count(self.inscription_transaction.c.id)])
-                .execution_options(autocommit=True)
-                .where(
-                    self.inscription_transaction.c.block_index >= min_block_index
-                ).where(
-                    self.inscription_transaction.c.block_index <= max_block_index
-                ).where(
-                    self.inscription_transaction.c.handled == True
-                ))
-                logger.info(f"unhandled {unhandled}, handled {handled}")
-            return unhandled == 0 and handled > 0
+            min_block_index, _ = self.get_block_index_range(start_block_height)
+            _, max_block_index = self.get_block_index_range(end_block_height)
+            async with self.acquire() as conn:
+                query = text(
+                    "SELECT block_index DIV 10000 AS block_height, SUM(handled = 1) AS handled, SUM(handled = 0) AS unhandled "
+                    "FROM inscription_transaction WHERE block_index >= :min_block_index AND block_index <= :max_block_index "
+                    "GROUP BY block_height"
+                ).execution_options(autocommit=True)
+                result = await conn.execute(
+                    query, {"min_block_index": min_block_index, "max_block_index": max_block_index}
+                )
+                records = await result.fetchall()
+                return {
+                    int(record["block_height"]): (int(record["handled"] or 0), int(record["unhandled"] or 0))
+                    for record in records
+                }
         except Exception as e:
-            error = f"Mysql::is_block_all_inscription_transactions_handled: Failed to detect block txs are all handled or not {e}"
+            error = f"Mysql::get_inscription_transaction_progress: Failed to count block inscription transactions {e}"
             logger.exception(error)
             raise Exception(error)
 
     async def get_block_inscription_transactions(self, block_height: int) -> Union[list[Inscription_Transaction], None]:
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 min_block_index, max_block_index = self.get_block_index_range(block_height)
                 query = self.inscription_transaction.select().execution_options(autocommit=True).where(
                     self.inscription_transaction.c.block_index >= min_block_index
@@ -162,37 +221,28 @@ class EventIndexer:
             logger.exception(error)
             raise Exception(error)
 
+    @staticmethod
+    async def fetch_inscription_content(inscription_id: str) -> bytes:
+        inscription = await ord_cli.get_inscription_content(inscription_id)
+        content = inscription.get('content')
+        if content is None:
+            raise Exception(f'Got {inscription_id} content is None')
+        if content:
+            return base64.b64decode(content.encode('utf-8'))
+        return b''
+
     async def get_inscription_content_by_id(self, inscription_id: str):
+        content = await self.content_cache.get(
+            inscription_id, lambda: self.fetch_inscription_content(inscription_id)
+        )
         try:
-            inscription = await ord_cli.get_inscription_content(inscription_id)
-            content = inscription.get('content')
-            if content is None:
-                raise Exception(f'Got {inscription_id} content is None')
-            if content:
-                content = base64.b64decode(content.encode('utf-8')).decode('utf-8')
-            return content
+            return content.decode('utf-8')
         except UnicodeDecodeError:
             return None
 
-    async def get_inscription_by_ids(self, inscription_ids: List[str]) -> Union[list[Inscription], None]:
-        if not inscription_ids:
-            return []
-        try:
-            async with self.engine.acquire() as conn:
-                query = text("SELECT id, inscription_id, inscription_number, owner, content_type, content, `timestamp`, genesis_height, location FROM inscription WHERE inscription_id IN :inscription_ids").execution_options(autocommit=True)
-                result = await conn.execute(query, {"inscription_ids": inscription_ids})
-                records = await result.fetchall()
-                if records is None:
-                    return None
-                return [Inscription(**record) for record in records]
-        except Exception as e:
-            error = f"Mysql::get_inscription_by_ids: Failed to get inscriptions {e}"
-            logger.exception(error)
-            raise Exception(error)
-
     async def get_inscription_by_id(self, inscription_id: str) -> Union[Inscription, None]:
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 query = self.inscription.select().execution_options(autocommit=True).where(self.inscription.c.inscription_id == inscription_id)
                 result = await conn.execute(query)
                 record = await result.fetchone()
@@ -206,7 +256,7 @@ class EventIndexer:
 
     async def get_inscription_transaction_by_id(self, inscription_id: str, txid: str) -> Union[Inscription_Transaction, None]:
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 query = self.inscription_transaction.select().execution_options(autocommit=True).where(
                     self.inscription_transaction.c.inscription_id == inscription_id
                 ).where(
@@ -227,7 +277,7 @@ class EventIndexer:
 
     async def get_inscription_transactions_by_txid(self, txid: str) -> Union[list[Inscription_Transaction], None]:
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 query = self.inscription_transaction.select().execution_options(autocommit=True).where(
                     self.inscription_transaction.c.txid == txid
                 )
@@ -246,9 +296,69 @@ class EventIndexer:
             logger.exception(error)
             raise Exception(error)
 
+    async def get_block_candidate_transactions(self, block_height: int) -> Union[list[Tuple[Inscription_Transaction, Inscription]], None]:
+        """
+        Get the inscription transactions of a block that may carry an ORC-20 instruction, with their inscription.
+
+        Transactions of the inscriptions in the brc20 ledger log of the block, with a negative
+        inscription number, or whose inscription is neither text nor json or has content without
+        an `orc-20` marker are filtered out by the database. Inscriptions stored without content
+        are kept, their content is fetched from ord.
+        """
+        try:
+            async with self.acquire() as conn:
+                min_block_index, max_block_index = self.get_block_index_range(block_height)
+                tx = self.inscription_transaction
+                inscription = self.inscription
+                ledger_log = self.brc20_token_ledger_log
+                content_type = func.lower(inscription.c.content_type)
+                query = select(
+                    [*tx.c, *[column.label(f"i_{column.name}") for column in inscription.c]]
+                ).select_from(
+                    tx.join(inscription, inscription.c.inscription_id == tx.c.inscription_id)
+                ).execution_options(autocommit=True).where(
+                    tx.c.block_index >= min_block_index
+                ).where(
+                    tx.c.block_index <= max_block_index
+                ).where(
+                    tx.c.inscription_number >= 0
+                ).where(
+                    ~sa.exists().where(
+                        ledger_log.c.id >= min_block_index
+                    ).where(
+                        ledger_log.c.id <= max_block_index
+                    ).where(
+                        ledger_log.c.inscription_id == tx.c.inscription_id
+                    )
+                ).where(
+                    sa.or_(content_type.contains("text"), content_type.contains("json"))
+                ).where(
+                    sa.or_(
+                        inscription.c.content.is_(None),
+                        inscription.c.content == "",
+                        func.lower(inscription.c.content).contains("orc-20"),
+                    )
+                )
+                result = await conn.execute(query)
+                records = await result.fetchall()
+                if records is None:
+                    return None
+
+                return [
+                    (
+                        Inscription_Transaction(**{column.name: record[column.name] for column in tx.c}),
+                        Inscription(**{column.name: record[f"i_{column.name}"] for column in inscription.c}),
+                    )
+                    for record in records
+                ]
+        except Exception as e:
+            error = f"Mysql::get_block_candidate_transactions: Failed to get block candidate transactions {e}"
+            logger.exception(error)
+            raise Exception(error)
+
     async def get_block_brc20_ledger_logs(self, block_height: int) -> Union[list[Brc20_Token_Ledger_Log], None]:
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 min_block_index, max_block_index = self.get_block_index_range(block_height)
                 query = self.brc20_token_ledger_log.select().execution_options(autocommit=True).where(
                     self.brc20_token_ledger_log.c.id >= min_block_index
@@ -289,68 +399,85 @@ class EventIndexer:
         while self.running:
             await asyncio.sleep(1)
 
+    async def commit_block_events(self, block_height: int, events: List[Event]):
+        """
+        Save the events of a block and mark it produced in one transaction, then notify it.
+        """
+        inscription_ids = [event.inscription_id for event in events if event.event_type == EventType.INSCRIBE]
+        await self.data_processer.begin_block(block_height)
+        try:
+            if events:
+                await self.data_processer.save_events(events)
+                await self.data_processer.save_orc20_inscriptions(block_height, inscription_ids)
+                await self.data_processer.mark_block_events_as_unhandled(block_height)
+                logger.info(f'Mark {block_height} events to unhandled')
+            await self.data_processer.mark_block_produced(block_height, len(events))
+            await self.data_processer.commit_block(block_height)
+        except Exception:
+            await self.data_processer.abort_block(block_height)
+            raise
+        if self.orc20_inscription_keys is not None:
+            self.orc20_inscription_keys.update(
+                self.get_orc20_inscription_key(inscription_id) for inscription_id in inscription_ids
+            )
+        # wake the data indexer up instead of letting it wait for its next poll
+        await self.data_processer.notify_block_events(block_height)
+
     async def process_tx(self, block):
         if len(block['tx']) == 1:
+            await self.commit_block_events(block['height'], [])
             return
         block_height = block['height']
         block_time = block['time']
 
-        while not self.stopped:
-            try:
-                await ord_cli.get_block(block_height)
+        candidates = None
+        while await self.readiness.wait(block_height):
+            candidates = await self.get_block_candidate_transactions(block_height)
+            if candidates is None:
+                break
+            # the candidates are only the rows left by the filters, every row of the block is
+            # counted too so an unhandled one the filters dropped still holds the block back
+            progress = await self.get_inscription_transaction_progress(block_height, block_height)
+            (handled, unhandled) = progress.get(block_height, (0, 0))
+            if unhandled == 0 and handled > 0 and all(
+                inscription_transaction.handled for inscription_transaction, _ in candidates
+            ):
                 break
-            except HttpNotFound:
-                logger.warning(f'Ord block {block_height} has not been proceed, wait')
-                await asyncio.sleep(5)
-            except Exception as e:
-                logger.exception(f'Get ord block {block_height} info error')
-                await asyncio.sleep(3)
-
-        while not self.stopped and not await self.is_block_all_inscription_transactions_handled(block_height):
+            # upstream went back on the block since it was seen done
             logger.info(f"Waiting for {block_height} all txs to be handled")
-            await asyncio.sleep(1)
-            continue
-
-        inscription_transactions = None
-        while not self.stopped:
-            inscription_transactions = await self.get_block_inscription_transactions(block_height)
-            if [1 for inscription_transaction in inscription_transactions if not inscription_transaction.handled]:
-                logger.info(f"Waiting for {block_height} all txs to be handled")
-                await asyncio.sleep(1)
-                continue
-            break
-
-        m_brc20_ledger_logs = set([brc20_ledger_log.inscription_id for brc20_ledger_log in await self.get_block_brc20_ledger_logs(block_height)])
-
-        inscription_transactions = list(filter(lambda x: x.inscription_id not in m_brc20_ledger_logs, inscription_transactions))
-
-        logger.info(f"Got {block_height} {len(inscription_transactions)} txs")
+            self.readiness.reset(block_height)
+            candidates = None
+        if candidates is None:
+            return
+        if self.orc20_inscription_keys is not None:
+            block_inscription_ids = {
+                inscription_transaction.inscription_id
+                for inscription_transaction, _ in candidates
+                if inscription_transaction.genesis_tx
+            }
+            candidates = [
+                candidate for candidate in candidates
+                if self.is_orc20_candidate(candidate[0], block_inscription_ids)
+            ]
+
+        logger.info(f"Got {block_height} {len(candidates)} candidate txs")
         tx_queue = Queue()
-        for tx in inscription_transactions:
-            tx_queue.put_nowait(tx)
+        for candidate in candidates:
+            tx_queue.put_nowait(candidate)
 
         events = []
 
         async def _process():
             while not self.stopped:
                 try:
-                    inscription_transaction = tx_queue.get_nowait()
+                    inscription_transaction, inscription = tx_queue.get_nowait()
                     # logger.debug(f'Process {block_height} tx, queue left {tx_queue.qsize()}')
                 except Empty:
                     break
                 else:
                     try:
-                        if inscription_transaction.inscription_number < 0:
-                            continue
                         inscription_id: str = inscription_transaction.inscription_id
                         # logger.info(f"Will process {block_height} {inscription_id} {inscription_transaction.txid}")
-                        inscription = await self.get_inscription_by_id(inscription_id)
-                        if inscription is None:
-                            logger.warning(f'Can not found {inscription_id} in mysql db')
-                            continue
-                        content_type = (inscription.content_type or '').lower()
-                        if not ('text' in content_type or 'json' in content_type):
-                            continue
                         content = inscription.content
                         if not content:
                             content = await self.get_inscription_content_by_id(inscription_id)
@@ -402,10 +529,7 @@ class EventIndexer:
             if ex:
                 raise ex
         logger.info(f"Produced {len(events)} events on block {block_height}")
-        if events:
-            await self.data_processer.save_events(events)
-            await self.data_processer.mark_block_events_as_unhandled(block_height)
-            logger.info(f'Mark {block_height} events to unhandled')
+        await self.commit_block_events(block_height, events)
 
     async def run(self, init_block_height):
         try:
@@ -418,6 +542,7 @@ class EventIndexer:
             while not self.stopped:
                 if await self.detect_reorg(current_block_height):
                     current_block_height -= 12
+                    self.readiness.reset(current_block_height)
 
                 for block_height in list(self.blocks.keys()):
                     if block_height > current_block_height or block_height < current_block_height - 12:
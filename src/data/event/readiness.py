@@ -0,0 +1,167 @@
+import os
+import sys
+import asyncio
+from typing import Dict
+
+from loguru import logger
+
+from httpx_helper import HttpNotFound
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src import ord_cli, metrics
+
+
+class BlockReadiness:
+    """
+    Tracks when the upstream indexers are done with the blocks the event indexer waits for.
+
+    A block is ready once ord has indexed it and every inscription transaction of the
+    block is handled, with at least one of them. The blocks waited for are resolved by a
+    single task, which reads the progress of a window of blocks from the lowest one
+    waited for with one grouped query, so the blocks after it are known ready as soon as
+    they are waited for. The task polls again after `min_interval` while the progress
+    moves and backs off up to `max_interval` while it does not. Polls are counted in the
+    `block_readiness.polls` metric.
+    """
+
+    def __init__(
+        self, event_indexer, window: int, min_interval: float, max_interval: float
+    ):
+        """
+        Args:
+            event_indexer (EventIndexer): The event indexer, which reads the progress.
+            window (int): The number of blocks read in one poll.
+            min_interval (float): The seconds between polls while the progress moves.
+            max_interval (float): The most seconds between polls.
+        """
+        self.event_indexer = event_indexer
+        self.window = window
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.ord_height = 0
+        self.ready = set()
+        self.progress = {}
+        self.waiters: Dict[int, asyncio.Future] = {}
+        self.task = None
+
+    async def wait(self, block_height: int) -> bool:
+        """
+        Wait for the upstream indexers to be done with a block.
+
+        Args:
+            block_height (int): The height of the block.
+
+        Returns:
+            bool: True once the block is ready, False if the event indexer stopped first.
+        """
+        if block_height in self.ready:
+            return True
+        waiter = self.waiters.get(block_height)
+        if waiter is None:
+            waiter = asyncio.get_running_loop().create_future()
+            self.waiters[block_height] = waiter
+        if self.task is None or self.task.done():
+            self.interval = self.min_interval
+            self.task = asyncio.create_task(self.run())
+        return await asyncio.shield(waiter)
+
+    def reset(self, block_height: int):
+        """
+        Forget what is known of a block and the ones after it, as they are reorganized.
+        """
+        self.ready = {height for height in self.ready if height < block_height}
+        self.progress = {
+            height: progress
+            for height, progress in self.progress.items()
+            if height < block_height
+        }
+        self.ord_height = min(self.ord_height, block_height - 1)
+
+    async def run(self):
+        while self.waiters:
+            if self.event_indexer.stopped:
+                self.resolve_all(False)
+                return
+            try:
+                moved = await self.poll()
+            except Exception:
+                logger.exception("Poll upstream progress error")
+                moved = False
+            self.interval = (
+                self.min_interval
+                if moved
+                else min(self.interval * 2, self.max_interval)
+            )
+            for block_height in [
+                height for height in self.waiters if height in self.ready
+            ]:
+                self.waiters.pop(block_height).set_result(True)
+            if self.waiters:
+                await asyncio.sleep(self.interval)
+
+    def resolve_all(self, result: bool):
+        for waiter in self.waiters.values():
+            if not waiter.done():
+                waiter.set_result(result)
+        self.waiters.clear()
+
+    async def poll(self) -> bool:
+        """
+        Read the progress of the window of blocks from the lowest one waited for.
+
+        Returns:
+            bool: Whether the progress moved since the last poll.
+        """
+        metrics.incr("block_readiness.polls")
+        start_block_height = min(self.waiters)
+        end_block_height = start_block_height + max(self.window, 1) - 1
+        self.ready = {height for height in self.ready if height >= start_block_height}
+        self.progress = {
+            height: progress
+            for height, progress in self.progress.items()
+            if height >= start_block_height
+        }
+        progress = await self.event_indexer.get_inscription_transaction_progress(
+            start_block_height, end_block_height
+        )
+        moved = False
+        handled_block_heights = []
+        for block_height in range(start_block_height, end_block_height + 1):
+            if block_height in self.ready:
+                continue
+            block_progress = progress.get(block_height, (0, 0))
+            if self.progress.get(block_height) != block_progress:
+                self.progress[block_height] = block_progress
+                moved = True
+            (handled, unhandled) = block_progress
+            if unhandled != 0 or handled == 0:
+                # blocks are waited for in order, the ones after it are read again next poll
+                break
+            handled_block_heights.append(block_height)
+        if not handled_block_heights:
+            return moved
+
+        # ord having indexed the last of them means it has indexed all of them
+        if not await self.is_ord_block_indexed(handled_block_heights[-1]):
+            if not await self.is_ord_block_indexed(handled_block_heights[0]):
+                logger.warning(
+                    f"Ord block {handled_block_heights[0]} has not been proceed, wait"
+                )
+                return moved
+            handled_block_heights = handled_block_heights[:1]
+        for block_height in handled_block_heights:
+            self.ready.add(block_height)
+            self.progress.pop(block_height, None)
+        return True
+
+    async def is_ord_block_indexed(self, block_height: int) -> bool:
+        if block_height <= self.ord_height:
+            return True
+        try:
+            await ord_cli.get_block(block_height)
+        except HttpNotFound:
+            return False
+        self.ord_height = block_height
+        return True
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+from loguru import logger
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src.data.processer.pgsql import Pgsql
+from src.data.processer.check_asyncpg import (
+    create_processer,
+    generate_blocks,
+    reset,
+    replay,
+    start_block_height,
+)
+
+
+async def bench(
+    backends: list, rounds: int, seed: int, blocks: int, events_per_block: int
+):
+    """
+    Replay the same blocks through each data processer and print the best events/s.
+    """
+    sequence = generate_blocks(seed, start_block_height(), blocks, events_per_block)
+    reader = Pgsql()
+    await reader.init()
+    best = {name: 0.0 for name in backends}
+    try:
+        # the backends take turns, so a slow stretch of the database hits them all alike
+        for _ in range(rounds):
+            for name in backends:
+                await reset(reader)
+                data_processer = create_processer(name)
+                await data_processer.init()
+                try:
+                    start = time.perf_counter()
+                    handled = await replay(data_processer, sequence)
+                    seconds = time.perf_counter() - start
+                finally:
+                    await data_processer.close()
+                best[name] = max(best[name], handled / seconds)
+    finally:
+        await reader.close()
+    for name, events_per_second in best.items():
+        print(f"{name:<8} {events_per_second:10.0f} events/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        "python bench_replay.py",
+        description="Clears the state and event tables of the PGSQL_* database, "
+        "point it to a scratch one.",
+    )
+    parser.add_argument("--database", required=True, help="overrides PGSQL_DB")
+    parser.add_argument("--backends", default="pgsql,asyncpg")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--blocks", type=int, default=50)
+    parser.add_argument("--events", type=int, default=200, help="events per block")
+    args = parser.parse_args()
+    os.environ["PGSQL_DB"] = args.database
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    asyncio.run(
+        bench(
+            args.backends.split(","), args.rounds, args.seed, args.blocks, args.events
+        )
+    )
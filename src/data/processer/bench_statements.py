@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+from decimal import Decimal
+from contextlib import asynccontextmanager
+
+from aiopg.sa.engine import get_dialect
+from sqlalchemy.dialects.postgresql import insert
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src.data.processer.pgsql import Pgsql
+from src.structure import Event, Balance
+
+
+dialect = get_dialect()
+
+
+def compile_statement(query) -> tuple:
+    """
+    Compile a statement and process its parameters as aiopg does on every execute.
+    """
+    compiled = query.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+    processors = compiled._bind_processors
+    params = {
+        key: processors[key](value) if key in processors else value
+        for key, value in compiled.construct_params().items()
+    }
+    return str(compiled), params
+
+
+class Result:
+    async def fetchone(self):
+        return None
+
+
+class Connection:
+    """
+    Takes the statements without running them, so only the client side is timed.
+    """
+
+    def __init__(self):
+        self.connection = self
+
+    async def execute(self, sql, params=None):
+        return Result()
+
+
+class Offline(Pgsql):
+    def __init__(self):
+        super().__init__()
+        self.conn = Connection()
+        self.compile_statements()
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+async def compiled_batch_upsert(data_processer: Pgsql, table, values: list[dict]):
+    # batch_upsert before the statements were prepared
+    for index in range(0, len(values), data_processer.batch_size):
+        insert_stmt = insert(table).values(
+            values[index : index + data_processer.batch_size]
+        )
+        on_conflict_stmt = insert_stmt.on_conflict_do_update(
+            index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
+        )
+        compile_statement(on_conflict_stmt)
+
+
+async def compiled_get_token(data_processer: Pgsql, token_id: int):
+    # get_token before the statements were prepared
+    compile_statement(
+        data_processer.token.select().where(data_processer.token.c.id == token_id)
+    )
+
+
+def create_benchmarks(rows: int) -> tuple:
+    data_processer = Offline()
+    balances = [
+        vars(
+            Balance(
+                f"bc1address{row}-{row % 7}",
+                f"tick{row % 7}",
+                row % 7,
+                f"{row:064x}i0",
+                f"bc1address{row}",
+                Decimal("1234.5"),
+                Decimal("1000"),
+                Decimal("234.5"),
+                Decimal("0"),
+            )
+        )
+        for row in range(rows)
+    ]
+    events = [
+        vars(
+            Event(
+                f"800000-{row}",
+                "INSCRIBE",
+                800000,
+                row,
+                1700000000,
+                f"{row:064x}i0",
+                row,
+                f"bc1address{row}",
+                f"bc1address{row}",
+                {
+                    "p": "orc-20",
+                    "op": "transfer",
+                    "params": {"tick": "orc", "amt": "100"},
+                },
+            )
+        )
+        for row in range(rows)
+    ]
+    balance, event = data_processer.balance, data_processer.event
+    return (
+        (
+            "upsert balance, compiled",
+            lambda: compiled_batch_upsert(data_processer, balance, balances[:1]),
+        ),
+        (
+            "upsert balance, prepared",
+            lambda: data_processer.batch_upsert(balance, balances[:1]),
+        ),
+        (
+            f"upsert {rows} balances, compiled",
+            lambda: compiled_batch_upsert(data_processer, balance, balances),
+        ),
+        (
+            f"upsert {rows} balances, prepared",
+            lambda: data_processer.batch_upsert(balance, balances),
+        ),
+        (
+            f"upsert {rows} events, compiled",
+            lambda: compiled_batch_upsert(data_processer, event, events),
+        ),
+        (
+            f"upsert {rows} events, prepared",
+            lambda: data_processer.batch_upsert(event, events),
+        ),
+        ("get token, compiled", lambda: compiled_get_token(data_processer, 1)),
+        ("get token, prepared", lambda: data_processer.get_token(1)),
+    )
+
+
+async def bench(rows: int, number: int, repeat: int):
+    """
+    Time the client side of the hot statements, compiled on each call as before and
+    prepared as now, and print the best time of each.
+    """
+    benchmarks = create_benchmarks(rows)
+    best = {name: float("inf") for name, _ in benchmarks}
+    # the benchmarks take turns, so a slow stretch of the machine hits them all alike
+    for _ in range(repeat):
+        for name, benchmark in benchmarks:
+            start = time.perf_counter()
+            for _ in range(number):
+                await benchmark()
+            best[name] = min(best[name], time.perf_counter() - start)
+    for name, seconds in best.items():
+        print(f"{name:<32} {seconds / number * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("python bench_statements.py")
+    parser.add_argument("--rows", type=int, default=100, help="rows of the batches")
+    parser.add_argument("--number", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(bench(args.rows, args.number, args.repeat))
@@ -0,0 +1,300 @@
+import os
+import sys
+from typing import Union, List
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src.data.processer.interface import Interface
+from src.structure import (
+    Event,
+    Token,
+    Balance,
+    Pending_Inscriptions,
+    OTC,
+    OTC_Record,
+    Undo_Log,
+)
+
+
+def clone(obj):
+    """
+    Copy a state object so that callers can mutate it freely.
+
+    Args:
+        obj: The Token, Balance, Pending_Inscriptions, OTC or OTC_Record to copy, or None.
+
+    Returns:
+        A new object of the same class with its list attributes copied, or None.
+    """
+    if obj is None:
+        return None
+    return obj.__class__(
+        **{
+            key: list(value) if isinstance(value, list) else value
+            for key, value in vars(obj).items()
+        }
+    )
+
+
+class BlockStateCache(Interface):
+    """
+    Write-back cache of the indexer state for the block being handled.
+
+    Reads are served from memory after the first fetch from the wrapped data processer,
+    saves only update memory and mark the object dirty, and `flush` writes every dirty
+    object, and every event handled in the block, back once together with the undo logs
+    needed to roll the block back. Every read returns a fresh copy, so handlers observe
+    the same semantics as when talking to the data processer directly.
+
+    Attributes:
+        data_processer (Interface): The data processer the cache is in front of.
+    """
+
+    def __init__(self, data_processer: Interface):
+        self.data_processer = data_processer
+        self.block_height = None
+        self.reset()
+
+    def reset(self):
+        """
+        Drop all cached and dirty objects.
+        """
+        self.tokens = {}
+        self.balances = {}
+        self.pending_inscriptions = {}
+        self.otcs = {}
+        self.otc_records = {}
+
+        self.dirty_tokens = set()
+        self.dirty_balances = set()
+        self.dirty_pending_inscriptions = set()
+        self.dirty_otcs = set()
+        self.saved_otc_records = {}
+
+        self.events = {}
+
+        # (table name, row id) -> row as first read from the data processer
+        self.originals = {}
+
+    async def flush(self):
+        """
+        Write every object changed since the last flush to the data processer.
+        """
+        tokens = [self.tokens[key] for key in self.dirty_tokens]
+        balances = [self.balances[key] for key in self.dirty_balances]
+        pending_inscriptions = [
+            self.pending_inscriptions[key] for key in self.dirty_pending_inscriptions
+        ]
+        otcs = [self.otcs[key] for key in self.dirty_otcs]
+        otc_records = list(self.saved_otc_records.values())
+        events = list(self.events.values())
+
+        undo_logs = await self.undo_logs()
+        if undo_logs:
+            await self.data_processer.save_undo_logs(undo_logs)
+        if tokens:
+            await self.data_processer.batch_save_tokens(tokens)
+        if balances:
+            await self.data_processer.batch_save_balances(balances)
+        if pending_inscriptions:
+            await self.data_processer.batch_save_pending_inscriptions(
+                pending_inscriptions
+            )
+        if otcs:
+            await self.data_processer.batch_save_otcs(otcs)
+        if otc_records:
+            await self.data_processer.batch_save_otc_records(otc_records)
+        if events:
+            await self.data_processer.save_events(events)
+
+        self.reset()
+
+    async def undo_logs(self) -> List[Undo_Log]:
+        """
+        Build the before-images of every dirty object.
+
+        Rows written without being read first are fetched from the data processer,
+        OTC records are always new unless their OTC's records were read.
+
+        Returns:
+            List[Undo_Log]: The undo logs of the block.
+        """
+        keys = [("token", key) for key in self.dirty_tokens]
+        keys.extend(("balance", key) for key in self.dirty_balances)
+        keys.extend(
+            ("pending_inscriptions", key) for key in self.dirty_pending_inscriptions
+        )
+        keys.extend(("otc", key) for key in self.dirty_otcs)
+        keys.extend(("otc_record", key) for key in self.saved_otc_records)
+
+        undo_logs = []
+        for seq, (table_name, key) in enumerate(keys):
+            if (table_name, key) in self.originals:
+                original = self.originals[(table_name, key)]
+            elif table_name == "token":
+                original = await self.data_processer.get_token(key)
+            elif table_name == "balance":
+                address, token_id = key.rsplit("-", 1)
+                original = await self.data_processer.get_balance(address, int(token_id))
+            elif table_name == "pending_inscriptions":
+                original = await self.data_processer.get_pending_inscription(key)
+            elif table_name == "otc":
+                original = await self.data_processer.get_otc(key)
+            else:
+                original = None
+
+            undo_logs.append(
+                Undo_Log(
+                    f"{self.block_height}-{seq}",
+                    self.block_height,
+                    seq,
+                    table_name,
+                    str(key),
+                    vars(original) if original is not None else None,
+                )
+            )
+        return undo_logs
+
+    def remember(self, table_name: str, key, obj):
+        self.originals.setdefault((table_name, key), clone(obj))
+
+    # ==================== block ====================
+
+    async def begin_block(self, block_height: int):
+        self.reset()
+        self.block_height = block_height
+        await self.data_processer.begin_block(block_height)
+
+    async def commit_block(self, block_height: int):
+        await self.flush()
+        await self.data_processer.commit_block(block_height)
+
+    async def abort_block(self, block_height: int):
+        self.reset()
+        await self.data_processer.abort_block(block_height)
+
+    # ==================== save ====================
+
+    async def save_events(self, events: list[Event]):
+        for event in events:
+            await self.save_event(event)
+
+    async def save_event(self, event: Event):
+        self.events[event.id] = event
+
+    async def save_pending_inscription(self, pending_inscription: Pending_Inscriptions):
+        self.pending_inscriptions[pending_inscription.id] = clone(pending_inscription)
+        self.dirty_pending_inscriptions.add(pending_inscription.id)
+
+    async def batch_save_pending_inscriptions(
+        self, pending_inscriptions: List[Pending_Inscriptions]
+    ):
+        for pending_inscription in pending_inscriptions:
+            await self.save_pending_inscription(pending_inscription)
+
+    async def save_token(self, token: Token):
+        self.tokens[token.id] = clone(token)
+        self.dirty_tokens.add(token.id)
+
+    async def batch_save_tokens(self, tokens: List[Token]):
+        for token in tokens:
+            await self.save_token(token)
+
+    async def save_balance(self, balance: Balance):
+        self.balances[balance.id] = clone(balance)
+        self.dirty_balances.add(balance.id)
+
+    async def batch_save_balances(self, balances: List[Balance]):
+        for balance in balances:
+            await self.save_balance(balance)
+
+    async def save_otc(self, otc: OTC):
+        self.otcs[otc.id] = clone(otc)
+        self.dirty_otcs.add(otc.id)
+
+    async def batch_save_otcs(self, otcs: List[OTC]):
+        for otc in otcs:
+            await self.save_otc(otc)
+
+    async def save_otc_record(self, otc_record: OTC_Record):
+        self.saved_otc_records[otc_record.id] = clone(otc_record)
+        if otc_record.oid in self.otc_records:
+            self.otc_records[otc_record.oid][otc_record.id] = clone(otc_record)
+
+    async def batch_save_otc_records(self, otc_records: List[OTC_Record]):
+        for otc_record in otc_records:
+            await self.save_otc_record(otc_record)
+
+    # ==================== get ====================
+
+    async def get_pending_inscription(
+        self, user: str
+    ) -> Union[Pending_Inscriptions, None]:
+        if user not in self.pending_inscriptions:
+            pending_inscription = await self.data_processer.get_pending_inscription(
+                user
+            )
+            self.pending_inscriptions.setdefault(user, pending_inscription)
+            self.remember("pending_inscriptions", user, pending_inscription)
+        return clone(self.pending_inscriptions[user])
+
+    async def get_token(self, token_id: int) -> Union[Token, None]:
+        if token_id not in self.tokens:
+            token = await self.data_processer.get_token(token_id)
+            self.tokens.setdefault(token_id, token)
+            self.remember("token", token_id, token)
+        return clone(self.tokens[token_id])
+
+    async def get_balance(self, address: str, token_id: int) -> Union[Balance, None]:
+        balance_id = f"{address}-{token_id}"
+        if balance_id not in self.balances:
+            balance = await self.data_processer.get_balance(address, token_id)
+            self.balances.setdefault(balance_id, balance)
+            self.remember("balance", balance_id, balance)
+        return clone(self.balances[balance_id])
+
+    async def get_otc(self, otc_id: int) -> Union[OTC, None]:
+        if otc_id not in self.otcs:
+            otc = await self.data_processer.get_otc(otc_id)
+            self.otcs.setdefault(otc_id, otc)
+            self.remember("otc", otc_id, otc)
+        return clone(self.otcs[otc_id])
+
+    async def get_otc_records(self, oid: int) -> Union[List[OTC_Record], None]:
+        if oid not in self.otc_records:
+            otc_records = await self.data_processer.get_otc_records(oid)
+            if otc_records is None:
+                return None
+            for otc_record in otc_records:
+                self.remember("otc_record", otc_record.id, otc_record)
+            if oid not in self.otc_records:
+                cached = {otc_record.id: otc_record for otc_record in otc_records}
+                for otc_record in self.saved_otc_records.values():
+                    if otc_record.oid == oid:
+                        cached[otc_record.id] = clone(otc_record)
+                self.otc_records[oid] = cached
+        return [clone(otc_record) for otc_record in self.otc_records[oid].values()]
+
+    # ==================== pass through ====================
+
+    async def save_undo_logs(self, undo_logs: List[Undo_Log]):
+        await self.data_processer.save_undo_logs(undo_logs)
+
+    async def rollback_to_block(self, block_height: int) -> bool:
+        self.reset()
+        return await self.data_processer.rollback_to_block(block_height)
+
+    async def delete_event_by_block(self, block_height):
+        return await self.data_processer.delete_event_by_block(block_height)
+
+    async def get_min_unhandled_block_height(self):
+        return await self.data_processer.get_min_unhandled_block_height()
+
+    async def restore_all_table(self):
+        return await self.data_processer.restore_all_table()
+
+    async def get_backup_block_height(self):
+        return await self.data_processer.get_backup_block_height()
+
+    async def mark_block_events_as_unhandled(self, block_height):
+        return await self.data_processer.mark_block_events_as_unhandled(block_height)
@@ -0,0 +1,370 @@
+import os
+import sys
+import copy
+import json
+import random
+import asyncio
+import argparse
+from typing import List
+
+from environs import Env
+from loguru import logger
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src.main import handle_event
+from src.structure import Event
+from src.data.processer.cache import BlockStateCache
+from src.data.processer.pgsql import Pgsql
+from src.data.snapshot import reader as snapshot_reader
+
+
+# the tables the handlers write, compared row by row
+compared_tables = (
+    "token",
+    "balance",
+    "pending_inscriptions",
+    "otc",
+    "otc_record",
+    "event",
+    "undo_log",
+)
+
+
+def create_processer(name: str) -> Pgsql:
+    if name == "pgsql":
+        return Pgsql()
+    if name == "asyncpg":
+        from src.data.processer.pgsql_asyncpg import AsyncPgsql
+
+        return AsyncPgsql()
+    raise Exception(f"check_asyncpg::create_processer: unknown data processer {name}")
+
+
+def start_block_height() -> int:
+    """
+    Get the first block height the handlers of every op apply to.
+    """
+    env = Env()
+    env.read_env()
+    return (
+        max(env.int("CORE_START_BLOCK_HEIGHT"), env.int("OTC_START_BLOCK_HEIGHT")) + 1
+    )
+
+
+def generate_blocks(
+    seed: int, start_block_height: int, blocks: int, events_per_block: int
+) -> List[List[dict]]:
+    """
+    Generate a sequence of blocks of ORC-20 events, valid and invalid ones alike.
+
+    Tokens are deployed first and then minted, transferred, burned, upgraded and traded
+    over the counter; transfers are inscribed and moved in a later event as on chain.
+
+    Args:
+        seed (int): The seed of the sequence.
+        start_block_height (int): The height of the first block.
+        blocks (int): The number of blocks.
+        events_per_block (int): The number of events in each block.
+
+    Returns:
+        List[List[dict]]: The events of each block, as `vars(event)`.
+    """
+    rng = random.Random(seed)
+    addresses = [f"address{index}" for index in range(8)]
+    ticks = {}
+    otcs = []
+    pending = []
+    inscription_number = 0
+    sequence = []
+    for block_height in range(start_block_height, start_block_height + blocks):
+        timestamp = 1700000000 + block_height * 600
+        events = []
+        for block_index in range(events_per_block):
+            if pending and rng.random() < 0.3:
+                (number, inscription_id, content, sender) = pending.pop(
+                    rng.randrange(len(pending))
+                )
+                event_type = "TRANSFER"
+                receiver = rng.choice(addresses + [""])
+            else:
+                inscription_number += 1
+                number = inscription_number
+                event_type = "INSCRIBE"
+                inscription_id = f"{number:064x}i0"
+                sender = rng.choice(addresses)
+                receiver = sender
+                content = generate_content(rng, number, ticks, otcs, timestamp)
+                if content["op"] in (
+                    "transfer",
+                    "burn",
+                    "upgrade",
+                    "otc-create",
+                    "otc-buy",
+                ):
+                    pending.append((number, inscription_id, content, sender))
+            events.append(
+                dict(
+                    id=f"{block_height}-{block_index}",
+                    event_type=event_type,
+                    block_height=block_height,
+                    block_index=block_index,
+                    timestamp=timestamp,
+                    inscription_id=inscription_id,
+                    inscription_number=number,
+                    sender=sender,
+                    receiver=receiver,
+                    content=content,
+                )
+            )
+        sequence.append(events)
+    return sequence
+
+
+def generate_content(
+    rng: random.Random, inscription_number: int, ticks: dict, otcs: list, timestamp: int
+) -> dict:
+    op = rng.choice(
+        ["deploy", "mint", "mint", "mint", "transfer", "transfer", "burn", "upgrade"]
+        + ["otc-create", "otc-buy", "otc-execute", "invalid"]
+    )
+    if not ticks or (op == "deploy" and len(ticks) < 6):
+        tick = f"t{inscription_number}"
+        ticks[str(inscription_number)] = tick
+        return {
+            "p": "orc-20",
+            "op": "deploy",
+            "params": {
+                "tick": tick,
+                "max": rng.choice(["1000", "100000", "21000000"]),
+                "lim": rng.choice(["10", "100", "1000"]),
+                "dec": rng.choice(["0", "2", "18"]),
+                "ug": "true",
+            },
+        }
+
+    tid = rng.choice(list(ticks))
+    if op == "mint" or op == "deploy":
+        op = "mint"
+        params = {
+            "tick": ticks[tid],
+            "tid": tid,
+            "amt": rng.choice(["1", "10", "5.5", "100"]),
+        }
+    elif op == "transfer" or op == "burn":
+        params = {
+            "tick": ticks[tid],
+            "tid": tid,
+            "amt": rng.choice(["1", "3", "0.5", "10"]),
+        }
+    elif op == "upgrade":
+        params = {"tick": ticks[tid], "tid": tid, "max": "42000000", "ug": "false"}
+    elif op == "otc-create":
+        tid2 = rng.choice(list(ticks))
+        # the otc is created under the number of the inscription once it is transferred
+        otcs.append((str(inscription_number), tid2))
+        params = {
+            "tick1": ticks[tid],
+            "tid1": tid,
+            "tick2": ticks[tid2],
+            "tid2": tid2,
+            "supply": rng.choice(["5", "10"]),
+            "er": rng.choice(["1", "2", "0.5"]),
+            "dl": str(timestamp + rng.choice([600, 1200, 6000000])),
+            "mba": "1",
+        }
+    elif op == "otc-buy":
+        (oid, tid) = rng.choice(otcs) if otcs else ("1", tid)
+        params = {
+            "tick": ticks[tid],
+            "tid": tid,
+            "oid": oid,
+            "amt": rng.choice(["1", "2"]),
+        }
+    elif op == "otc-execute":
+        params = {"oid": rng.choice(otcs)[0] if otcs else "1"}
+    else:
+        return {"p": "orc-20", "op": "mint", "params": {"tick": ticks[tid]}, "x": 1}
+    return {"p": "orc-20", "op": op, "params": params}
+
+
+async def reset(data_processer: Pgsql):
+    """
+    Empty the tables the replay writes.
+    """
+    async with data_processer.acquire() as conn:
+        # the event indexer creates the enum of the event table, which a scratch database lacks
+        await conn.execute(
+            "DO $$ BEGIN CREATE TYPE event_type AS ENUM ('TRANSFER', 'INSCRIBE'); "
+            "EXCEPTION WHEN duplicate_object THEN NULL; END $$"
+        )
+    await data_processer.clear_all_tables()
+    await data_processer.clear_table(
+        data_processer.event, "event", data_processer.event_index_list
+    )
+    await data_processer.create_all_table()
+    await data_processer.delete_backup_block_height()
+
+
+async def load_snapshot(data_processer: Pgsql, holders: int):
+    """
+    Bulk load the snapshot tokens as `Run.load_snapshot` does, with holders made up for
+    the first of them in the float form of the snapshot files.
+    """
+    data_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../snapshot/"))
+    tokens = [
+        dict(token, circulating=token["minted"])
+        for _, token in snapshot_reader.iter_items(f"{data_path}/tokens.json")
+    ]
+    await data_processer.bulk_load_tokens_in_dict(iter(tokens))
+    balances = []
+    for index in range(holders):
+        token = tokens[index % len(tokens)]
+        address = f"snapshot{index}"
+        balance = float(index % 1000) + 0.5
+        balances.append(
+            dict(
+                id=f"{address}-{token['id']}",
+                tick=token["tick"],
+                tid=token["id"],
+                inscription_id=token["inscription_id"],
+                address=address,
+                balance=balance,
+                available_balance=balance,
+                transferable_balance=0.0,
+                original_balance=balance,
+            )
+        )
+    await data_processer.bulk_load_balances_in_dict(iter(balances))
+
+
+async def replay(data_processer: Pgsql, blocks: List[List[dict]]) -> int:
+    """
+    Handle the blocks one after another as `Run.handle_block` does.
+
+    Returns:
+        int: The number of events handled.
+    """
+    block_state = BlockStateCache(data_processer)
+    handled = 0
+    for events in blocks:
+        block_height = events[0]["block_height"]
+        await block_state.begin_block(block_height)
+        try:
+            for event in events:
+                await handle_event(Event(**copy.deepcopy(event)), block_state)
+            await data_processer.mark_backup_block_height(block_height)
+            await data_processer.prune_undo_logs(block_height)
+            await block_state.commit_block(block_height)
+        except Exception:
+            await block_state.abort_block(block_height)
+            raise
+        handled += len(events)
+    return handled
+
+
+async def dump(reader: Pgsql) -> dict:
+    """
+    Read the compared tables, the rows of each by id as JSON text.
+    """
+    tables = {}
+    async with reader.acquire() as conn:
+        for table_name in compared_tables:
+            table = getattr(reader, table_name)
+            result = await conn.execute(table.select())
+            tables[table_name] = {
+                str(record["id"]): json.dumps(dict(record), sort_keys=True, default=str)
+                for record in await result.fetchall()
+            }
+    return tables
+
+
+def compare(name: str, expected: dict, actual: dict, limit: int = 5) -> int:
+    """
+    Print the rows that differ between two dumps.
+
+    Returns:
+        int: The number of rows that differ.
+    """
+    mismatches = 0
+    for table_name in compared_tables:
+        expected_rows = expected[table_name]
+        actual_rows = actual[table_name]
+        for row_id in sorted(set(expected_rows) | set(actual_rows)):
+            if expected_rows.get(row_id) == actual_rows.get(row_id):
+                continue
+            mismatches += 1
+            if mismatches <= limit:
+                print(f"{name} {table_name} {row_id}:")
+                print(f"  pgsql:   {expected_rows.get(row_id)}")
+                print(f"  asyncpg: {actual_rows.get(row_id)}")
+    return mismatches
+
+
+async def run_backend(
+    name: str, reader: Pgsql, blocks: List[List[dict]], holders: int
+) -> tuple:
+    """
+    Load the snapshot and replay the blocks through a data processer, then roll back up to half of them, as
+    deep as the undo logs go.
+
+    Returns:
+        tuple: The dumps after the replay and after the rollback.
+    """
+    await reset(reader)
+    data_processer = create_processer(name)
+    await data_processer.init()
+    try:
+        await load_snapshot(data_processer, holders)
+        await replay(data_processer, blocks)
+        replayed = await dump(reader)
+        block_height = blocks[-1][0]["block_height"] - min(
+            len(blocks) // 2, data_processer.undo_depth
+        )
+        if not await BlockStateCache(data_processer).rollback_to_block(block_height):
+            raise Exception(f"check_asyncpg::run_backend: {name} could not roll back")
+        rolled_back = await dump(reader)
+    finally:
+        await data_processer.close()
+    return replayed, rolled_back
+
+
+async def check(seed: int, blocks: int, events_per_block: int, holders: int) -> int:
+    """
+    Replay the same blocks through Pgsql and AsyncPgsql and compare what they stored.
+
+    Returns:
+        int: The number of rows that differ.
+    """
+    sequence = generate_blocks(seed, start_block_height(), blocks, events_per_block)
+
+    reader = Pgsql()
+    await reader.init()
+    try:
+        expected = await run_backend("pgsql", reader, sequence, holders)
+        actual = await run_backend("asyncpg", reader, sequence, holders)
+    finally:
+        await reader.close()
+    return compare("replayed", expected[0], actual[0]) + compare(
+        "rolled back", expected[1], actual[1]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        "python check_asyncpg.py",
+        description="Clears the state and event tables of the PGSQL_* database, "
+        "point it to a scratch one.",
+    )
+    parser.add_argument("--database", required=True, help="overrides PGSQL_DB")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--blocks", type=int, default=50)
+    parser.add_argument("--events", type=int, default=100, help="events per block")
+    parser.add_argument("--holders", type=int, default=10000, help="snapshot balances")
+    args = parser.parse_args()
+    os.environ["PGSQL_DB"] = args.database
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+    mismatches = asyncio.run(check(args.seed, args.blocks, args.events, args.holders))
+    print(f"{args.blocks} blocks of {args.events} events, {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
@@ -5,7 +5,7 @@ from abc import ABC, abstractmethod
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token, Balance, Pending_Inscriptions, OTC, OTC_Record
+from src.structure import Event, Token, Balance, Pending_Inscriptions, OTC, OTC_Record, Undo_Log
 
 
 from abc import ABC, abstractmethod
@@ -19,6 +19,39 @@ class Interface(ABC):
     All methods defined in this interface should be implemented by the concrete class.
     """
 
+    @abstractmethod
+    async def begin_block(self, block_height: int):
+        """
+        Start the unit of work of a block.
+
+        Every read and write issued until `commit_block` or `abort_block` belongs to the block
+        and is applied atomically.
+
+        Args:
+            block_height (int): The height of the block being handled.
+        """
+        pass
+
+    @abstractmethod
+    async def commit_block(self, block_height: int):
+        """
+        Apply every write issued since `begin_block` at once.
+
+        Args:
+            block_height (int): The height of the block being handled.
+        """
+        pass
+
+    @abstractmethod
+    async def abort_block(self, block_height: int):
+        """
+        Discard every write issued since `begin_block`.
+
+        Args:
+            block_height (int): The height of the block being handled.
+        """
+        pass
+
     @abstractmethod
     async def save_events(self, events: list[Event]):
         pass
@@ -73,6 +106,28 @@ class Interface(ABC):
         """
         pass
 
+    @abstractmethod
+    async def batch_save_tokens(self, tokens: List[Token]):
+        """
+        Save multiple tokens.
+
+        Args:
+            tokens (List[Token]): The list of tokens to be saved.
+        """
+        pass
+
+    @abstractmethod
+    async def batch_save_pending_inscriptions(
+        self, pending_inscriptions: List[Pending_Inscriptions]
+    ):
+        """
+        Save multiple pending inscriptions.
+
+        Args:
+            pending_inscriptions (List[Pending_Inscriptions]): The list of pending inscriptions to be saved.
+        """
+        pass
+
     @abstractmethod
     async def save_otc(self, otc: OTC):
         """
@@ -93,6 +148,49 @@ class Interface(ABC):
         """
         pass
 
+    @abstractmethod
+    async def batch_save_otcs(self, otcs: List[OTC]):
+        """
+        Save multiple OTC trades.
+
+        Args:
+            otcs (List[OTC]): The list of OTC trades to be saved.
+        """
+        pass
+
+    @abstractmethod
+    async def batch_save_otc_records(self, otc_records: List[OTC_Record]):
+        """
+        Save multiple OTC trade records.
+
+        Args:
+            otc_records (List[OTC_Record]): The list of OTC trade records to be saved.
+        """
+        pass
+
+    @abstractmethod
+    async def save_undo_logs(self, undo_logs: List[Undo_Log]):
+        """
+        Save the before-images of the rows changed by a block.
+
+        Args:
+            undo_logs (List[Undo_Log]): The undo logs to be saved.
+        """
+        pass
+
+    @abstractmethod
+    async def rollback_to_block(self, block_height: int) -> bool:
+        """
+        Undo every block applied above a block height.
+
+        Args:
+            block_height (int): The height of the last block to keep.
+
+        Returns:
+            bool: False if the undo logs do not reach down to the block height.
+        """
+        return False
+
     @abstractmethod
     async def get_pending_inscription(
         self, user: str
@@ -1,20 +1,66 @@
+import io
 import os
 import sys
+import json
+import time
 import asyncio
+import weakref
+import contextvars
+from decimal import Decimal
+from contextlib import asynccontextmanager
 from environs import Env
-from typing import Union, Tuple
+from typing import Union, List, Tuple, AsyncIterator
 import sqlalchemy as sa
 from sqlalchemy import func, select
 from sqlalchemy.sql.ddl import CreateTable, CreateIndex
 from sqlalchemy.dialects.postgresql import ENUM, JSON, ARRAY
-from sqlalchemy.dialects.postgresql import insert
+import psycopg2
+from psycopg2.extras import Json
 from aiopg.sa import create_engine
 from loguru import logger
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
+from src import metrics
 from src.data.processer.interface import Interface
-from src.structure import Event, Token, Balance, Pending_Inscriptions, OTC, OTC_Record, Backup_Height
+from src.structure import Event, Token, Balance, Pending_Inscriptions, OTC, OTC_Record, Backup_Height, Undo_Log, Block_Status
+
+
+def copy_value(value) -> str:
+    """
+    Format a value as a field of the COPY text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, list):
+        items = [
+            "NULL"
+            if item is None
+            else '"' + str(item).replace("\\", "\\\\").replace('"', '\\"') + '"'
+            for item in value
+        ]
+        value = "{" + ",".join(items) + "}"
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    else:
+        value = str(value)
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def column_default(column):
+    """
+    Get the value a column takes when a row does not set it.
+    """
+    if column.default is not None and column.default.is_scalar:
+        return column.default.arg
+    return None
 
 
 class Pgsql(Interface):
@@ -41,7 +87,12 @@ class Pgsql(Interface):
             sa.Column("handled", sa.Boolean),
         )
         self.event_index_list = [
-            sa.Index("block_height", self.event.c.block_height),
+            # events of a block range are read in (block_height, block_index) order
+            sa.Index(
+                "event_block_height_block_index",
+                self.event.c.block_height,
+                self.event.c.block_index,
+            ),
             sa.Index("block_index", self.event.c.block_index),
             sa.Index("handled", self.event.c.handled),
         ]
@@ -188,21 +239,114 @@ class Pgsql(Interface):
             sa.Column("block_height", sa.BigInteger),
         )
 
+        self.undo_log = sa.Table(
+            "undo_log",
+            metadata,
+            # {block_height}-{seq}
+            sa.Column("id", sa.String(255), primary_key=True, unique=True),
+            sa.Column("block_height", sa.BigInteger),
+            sa.Column("seq", sa.Integer),
+            sa.Column("table_name", sa.String(255)),
+            sa.Column("row_id", sa.String(255)),
+            # row before the block was applied, null if it did not exist
+            sa.Column("image", JSON),
+        )
+        self.undo_log_index_list = [
+            sa.Index("undo_log_block_height", self.undo_log.c.block_height),
+        ]
+
+        self.block_status = sa.Table(
+            "block_status",
+            metadata,
+            # block height
+            sa.Column("id", sa.BigInteger, primary_key=True, unique=True),
+            sa.Column("event_count", sa.BigInteger, default=0),
+            sa.Column("produced", sa.Boolean, default=False),
+            sa.Column("applied", sa.Boolean, default=False),
+            sa.Column("produced_time", sa.BigInteger),
+            sa.Column("applied_time", sa.BigInteger),
+        )
+        self.block_status_index_list = [
+            sa.Index(
+                "block_status_unapplied",
+                self.block_status.c.id,
+                postgresql_where=self.block_status.c.applied == False,
+            ),
+        ]
+
+        self.orc20_inscription = sa.Table(
+            "orc20_inscription",
+            metadata,
+            # inscription id of an inscription whose genesis content is an orc-20 instruction
+            sa.Column("id", sa.String(255), primary_key=True, unique=True),
+            sa.Column("block_height", sa.BigInteger),
+        )
+        self.orc20_inscription_index_list = [
+            sa.Index(
+                "orc20_inscription_block_height", self.orc20_inscription.c.block_height
+            ),
+        ]
+
+        self.state_tables = {
+            "token": self.token,
+            "balance": self.balance,
+            "pending_inscriptions": self.pending_inscriptions,
+            "otc": self.otc,
+            "otc_record": self.otc_record,
+        }
+        # blocks that can be rolled back, as deep as the event indexer looks for reorgs
+        self.undo_depth = 12
+
+        # rows per multi-row upsert statement
+        self.batch_size = 1000
+        # rows per COPY FROM STDIN round-trip of a bulk load
+        self.copy_size = 10000
+        # rows per FETCH of a streaming cursor
+        self.fetch_size = 1000
+
+        # the event indexer notifies this channel with the height of every block it produced
+        self.block_events_channel = "block_events"
+        self.listen_conn = None
+
+        # connection and transaction of the block being handled, only seen by the task
+        # handling it and the tasks it spawns, so other tasks keep using the pool
+        self.block_context = contextvars.ContextVar("block_context", default=(None, None))
+        self.block_lock = asyncio.Lock()
+        self.pool_timeout = None
+
+        # connection -> names of the statements prepared on it
+        self.prepared = weakref.WeakKeyDictionary()
+
     # ==================== initialize ====================
 
     async def init(self):
         env = Env()
         env.read_env()
-        self.engine = await create_engine(
+        self.connect_kwargs = dict(
             user=env.str("PGSQL_USER"),
             password=env.str("PGSQL_PASSWD"),
             database=env.str("PGSQL_DB"),
             host=env.str("PGSQL_HOST"),
             port=env.int("PGSQL_PORT")
         )
+        # milliseconds, 0 disables it
+        statement_timeout = env.int("PGSQL_STATEMENT_TIMEOUT", 0)
+        if statement_timeout:
+            self.connect_kwargs["options"] = f"-c statement_timeout={statement_timeout}"
+        self.pool_timeout = env.float("PGSQL_POOL_ACQUIRE_TIMEOUT", 60)
+        self.engine = await create_engine(
+            minsize=env.int("PGSQL_POOL_MINSIZE", 1),
+            maxsize=env.int("PGSQL_POOL_MAXSIZE", 10),
+            **self.connect_kwargs
+        )
+        self.compile_statements()
 
     async def close(self):
         try:
+            if self.listen_conn is not None:
+                conn = self.listen_conn
+                self.listen_conn = None
+                await metrics.release_connection("pgsql", lambda conn: conn.close(), conn)
             self.engine.close()
             await self.engine.wait_closed()
         except Exception as e:
@@ -210,6 +354,170 @@ class Pgsql(Interface):
             logger.error(error)
             raise Exception(error)
 
+    def compile_statements(self):
+        """
+        Build the text of the prepared statements used on the hot paths once.
+
+        Every statement is prepared on a connection the first time it runs there and
+        executed with only its parameters afterwards.
+        """
+        self.prepare_sqls = {}
+        self.execute_sqls = {}
+        self.batch_sqls = {}
+        self.binds = {}
+
+        for table in [
+            self.event,
+            self.token,
+            self.balance,
+            self.pending_inscriptions,
+            self.otc,
+            self.otc_record,
+            self.backup_height,
+            self.undo_log,
+            self.block_status,
+        ]:
+            columns = [column.name for column in table.columns]
+            quoted_columns = ", ".join(f'"{column}"' for column in columns)
+            placeholders = ", ".join(f"${index + 1}" for index in range(len(columns)))
+            updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns)
+            name = f"upsert_{table.name}"
+            self.prepare_sqls[name] = (
+                f'PREPARE {name} AS INSERT INTO "{table.name}" ({quoted_columns}) '
+                f'VALUES ({placeholders}) ON CONFLICT ("id") DO UPDATE SET {updates}'
+            )
+            self.execute_sqls[name] = (
+                f"EXECUTE {name}(" + ", ".join(f"%({column})s" for column in columns) + ")"
+            )
+            self.binds[table.name] = [
+                (column.name, column_default(column), isinstance(column.type, JSON))
+                for column in table.columns
+            ]
+
+        for table, key in [
+            (self.token, "id"),
+            (self.balance, "id"),
+            (self.pending_inscriptions, "id"),
+            (self.otc, "id"),
+            (self.otc_record, "oid"),
+        ]:
+            quoted_columns = ", ".join(f'"{column.name}"' for column in table.columns)
+            name = f"select_{table.name}_by_{key}"
+            self.prepare_sqls[name] = (
+                f'PREPARE {name} AS SELECT {quoted_columns} FROM "{table.name}" WHERE "{key}" = $1'
+            )
+            self.execute_sqls[name] = f"EXECUTE {name}(%(value)s)"
+
+        quoted_columns = ", ".join(f'"{column.name}"' for column in self.event.columns)
+        self.prepare_sqls["select_event_by_block_height"] = (
+            f'PREPARE select_event_by_block_height AS SELECT {quoted_columns} FROM "event" '
+            f'WHERE "block_height" = $1 ORDER BY "block_index"'
+        )
+        self.execute_sqls["select_event_by_block_height"] = (
+            "EXECUTE select_event_by_block_height(%(value)s)"
+        )
+        self.select_events_by_block_range_sql = (
+            f'SELECT {quoted_columns} FROM "event" '
+            f'WHERE "block_height" >= %(start)s AND "block_height" < %(end)s '
+            f'ORDER BY "block_height", "block_index"'
+        )
+
+    def batch_sql(self, table, count: int) -> str:
+        key = (table.name, count)
+        if key not in self.batch_sqls:
+            columns = [column.name for column in table.columns]
+            self.batch_sqls[key] = "".join(
+                f"EXECUTE upsert_{table.name}("
+                + ", ".join(f"%({column}_{row})s" for column in columns)
+                + ");"
+                for row in range(count)
+            )
+        return self.batch_sqls[key]
+
+    def bind(self, table, value: dict) -> dict:
+        params = {}
+        for name, default, is_json in self.binds[table.name]:
+            item = value.get(name, default)
+            params[name] = Json(item) if is_json and item is not None else item
+        return params
+
+    async def execute_prepared(self, conn, name: str, params: dict, sql: str = None):
+        prepared = self.prepared.setdefault(conn.connection, set())
+        if name not in prepared:
+            await conn.execute(self.prepare_sqls[name])
+            prepared.add(name)
+        return await conn.execute(sql or self.execute_sqls[name], params)
+
+    @property
+    def block_conn(self):
+        return self.block_context.get()[0]
+
+    @block_conn.setter
+    def block_conn(self, conn):
+        self.block_context.set((conn, self.block_transaction))
+
+    @property
+    def block_transaction(self):
+        return self.block_context.get()[1]
+
+    @block_transaction.setter
+    def block_transaction(self, transaction):
+        self.block_context.set((self.block_conn, transaction))
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.block_conn is None:
+            async with metrics.pooled(
+                "pgsql", self.engine.acquire, self.engine.release, self.pool_timeout
+            ) as conn:
+                yield conn
+        else:
+            # a connection runs one statement at a time
+            async with self.block_lock:
+                yield self.block_conn
+
+    # ==================== block ====================
+
+    async def begin_block(self, block_height: int):
+        try:
+            self.block_conn = await metrics.acquire_connection(
+                "pgsql", self.engine.acquire, self.pool_timeout
+            )
+            self.block_transaction = await self.block_conn.begin()
+        except Exception as e:
+            await self.release_block_conn()
+            error = f"Pgsql::begin_block: Failed to begin block {block_height} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def commit_block(self, block_height: int):
+        try:
+            await self.block_transaction.commit()
+        except Exception as e:
+            error = f"Pgsql::commit_block: Failed to commit block {block_height} {e}"
+            logger.error(error)
+            raise Exception(error)
+        finally:
+            await self.release_block_conn()
+
+    async def abort_block(self, block_height: int):
+        try:
+            if self.block_transaction is not None and self.block_transaction.is_active:
+                await self.block_transaction.rollback()
+        except Exception as e:
+            error = f"Pgsql::abort_block: Failed to rollback block {block_height} {e}"
+            logger.error(error)
+        finally:
+            await self.release_block_conn()
+
+    async def release_block_conn(self):
+        conn = self.block_conn
+        self.block_conn = None
+        self.block_transaction = None
+        if conn is not None:
+            # closing an SAConnection rolls back what is left and gives it back to the pool
+            await metrics.release_connection("pgsql", lambda conn: conn.close(), conn)
+
     async def backup_all_table(self):
         logger.info(f"Pgsql::backup_all_table: backup all table")
         done, _ = await asyncio.wait([
@@ -226,7 +534,7 @@ class Pgsql(Interface):
 
     async def backup_table(self, origin_table_name, index_list=[]):
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 await conn.execute(f'DROP TABLE IF EXISTS "{origin_table_name}_backup" CASCADE')
                 await conn.execute(f'CREATE TABLE "{origin_table_name}_backup" AS SELECT * FROM {origin_table_name};')
                 # for index in index_list:
@@ -254,7 +562,7 @@ class Pgsql(Interface):
 
     async def restore_table(self, origin_table_name):
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 result = await conn.scalar(f"SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema = 'public' AND table_name = '{origin_table_name}_backup');")
                 if bool(result):
                     await conn.execute(f'ALTER TABLE {origin_table_name} RENAME TO {origin_table_name}_temp;')
@@ -267,7 +575,7 @@ class Pgsql(Interface):
 
     async def clear_table(self, table, table_name, index_list=[]):
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 await conn.execute(f'DROP TABLE IF EXISTS "{table_name}" CASCADE')
                 await conn.execute(CreateTable(table, if_not_exists=True))
                 for index in index_list:
@@ -286,13 +594,61 @@ class Pgsql(Interface):
         await self.create_table(self.balance, self.balance_index_list)
         await self.create_table(self.otc, self.otc_index_list)
         await self.create_table(self.otc_record, self.otc_record_index_list)
+        await self.create_table(self.undo_log, self.undo_log_index_list)
+        await self.create_table(self.block_status, self.block_status_index_list)
+        await self.create_table(self.orc20_inscription, self.orc20_inscription_index_list)
 
     async def init_backup_height_table(self):
         await self.create_table(self.backup_height)
 
+    async def init_block_status_table(self):
+        """
+        Create the block status table, filling it from the event table on first use.
+        """
+        await self.create_table(self.block_status, self.block_status_index_list)
+        try:
+            async with self.acquire() as conn:
+                if await conn.scalar('SELECT EXISTS (SELECT 1 FROM "block_status")'):
+                    return
+                await conn.execute(
+                    'INSERT INTO "block_status" ("id", "event_count", "produced", "applied", "produced_time") '
+                    'SELECT "block_height", count(*), true, bool_and("handled"), %(now)s '
+                    'FROM "event" GROUP BY "block_height"',
+                    {"now": int(time.time())},
+                )
+        except Exception as e:
+            error = f"Pgsql::init_block_status_table: Failed to fill block status {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def init_event_table(self):
+        await self.create_table(self.event, self.event_index_list)
+
+    async def init_orc20_inscription_table(self):
+        """
+        Create the orc-20 inscription registry, filling it from the event table on first use.
+        """
+        await self.create_table(self.orc20_inscription, self.orc20_inscription_index_list)
+        try:
+            async with self.acquire() as conn:
+                if await conn.scalar('SELECT EXISTS (SELECT 1 FROM "orc20_inscription")'):
+                    return
+                await conn.execute(
+                    'INSERT INTO "orc20_inscription" ("id", "block_height") '
+                    'SELECT "inscription_id", min("block_height") FROM "event" '
+                    "WHERE \"event_type\" = 'INSCRIBE' GROUP BY \"inscription_id\""
+                )
+        except Exception as e:
+            error = f"Pgsql::init_orc20_inscription_table: Failed to fill orc20 inscriptions {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def init_undo_log_table(self):
+        await self.create_table(self.undo_log, self.undo_log_index_list)
+
     async def create_table(self, table, index_list=[]):
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 await conn.execute(CreateTable(table, if_not_exists=True))
                 for index in index_list:
                     await conn.execute(CreateIndex(index, if_not_exists=True))
@@ -309,31 +665,129 @@ class Pgsql(Interface):
         await self.clear_table(
             self.otc_record, "otc_record", self.otc_record_index_list
         )
+        await self.clear_table(self.undo_log, "undo_log", self.undo_log_index_list)
+
+    # ==================== bulk load ====================
+
+    async def bulk_load(self, table, table_name, rows, index_list=[]):
+        """
+        Recreate a table and fill it with COPY FROM STDIN, building its indexes afterwards.
+
+        Args:
+            table (sa.Table): The table to load.
+            table_name (str): The name of the table.
+            rows (Iterable[dict]): The rows to load, keyed by column name.
+            index_list (list[sa.Index], optional): The indexes to build once the rows are loaded.
+        """
+        try:
+            start = time.time()
+            async with self.acquire() as conn:
+                await conn.execute(f'DROP TABLE IF EXISTS "{table_name}" CASCADE')
+                await conn.execute(CreateTable(table))
+
+            loop = asyncio.get_running_loop()
+            count = await loop.run_in_executor(
+                None, self.copy_rows, table, table_name, rows
+            )
+
+            async with self.acquire() as conn:
+                for index in index_list:
+                    await conn.execute(CreateIndex(index, if_not_exists=True))
+
+            elapsed = max(time.time() - start, 1e-6)
+            logger.info(
+                f"Pgsql::bulk_load: loaded {count} rows into {table_name} in {elapsed:.2f}s ({count / elapsed:.0f} rows/s)"
+            )
+        except Exception as e:
+            error = f"Pgsql::bulk_load: Failed to bulk load {table_name} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    def copy_rows(self, table, table_name, rows) -> int:
+        # aiopg connections are asynchronous and cannot run COPY, so the rows
+        # are streamed through a blocking psycopg2 connection in an executor
+        columns = [column.name for column in table.columns]
+        defaults = {column.name: column_default(column) for column in table.columns}
+        quoted_columns = ", ".join(f'"{column}"' for column in columns)
+        sql = f'COPY "{table_name}" ({quoted_columns}) FROM STDIN'
+
+        count = 0
+        conn = psycopg2.connect(**self.connect_kwargs)
+        try:
+            with conn.cursor() as cursor:
+                buffer = io.StringIO()
+                for row in rows:
+                    buffer.write(
+                        "\t".join(
+                            copy_value(row.get(column, defaults[column]))
+                            for column in columns
+                        )
+                    )
+                    buffer.write("\n")
+                    count += 1
+                    if count % self.copy_size == 0:
+                        buffer.seek(0)
+                        cursor.copy_expert(sql, buffer)
+                        buffer = io.StringIO()
+                if buffer.tell() > 0:
+                    buffer.seek(0)
+                    cursor.copy_expert(sql, buffer)
+            conn.commit()
+        finally:
+            conn.close()
+        return count
+
+    async def bulk_load_tokens_in_dict(self, tokens):
+        await self.bulk_load(self.token, "token", tokens, self.token_index_list)
+
+    async def bulk_load_balances_in_dict(self, balances):
+        await self.bulk_load(self.balance, "balance", balances, self.balance_index_list)
 
     # ==================== save ====================
 
     async def save_token(self, token: Token):
         try:
-            insert_stmt = insert(self.token).values(vars(token))
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.upsert(self.token, vars(token))
 
         except Exception as e:
             error = f"Pgsql::save_token: Failed to save token {e}"
             logger.error(error)
             raise Exception(error)
 
+    async def upsert(self, table, value: dict):
+        async with self.acquire() as conn:
+            await self.execute_prepared(
+                conn, f"upsert_{table.name}", self.bind(table, value)
+            )
+
+    async def batch_upsert(self, table, values: list[dict]):
+        # one round-trip per chunk, each row runs the prepared upsert
+        for index in range(0, len(values), self.batch_size):
+            chunk = values[index : index + self.batch_size]
+            params = {}
+            for row, value in enumerate(chunk):
+                for key, item in self.bind(table, value).items():
+                    params[f"{key}_{row}"] = item
+            async with self.acquire() as conn:
+                await self.execute_prepared(
+                    conn,
+                    f"upsert_{table.name}",
+                    params,
+                    self.batch_sql(table, len(chunk)),
+                )
+
+    async def batch_save_tokens(self, tokens: list[Token]):
+        try:
+            await self.batch_upsert(self.token, [vars(token) for token in tokens])
+
+        except Exception as e:
+            error = f"Pgsql::batch_save_tokens: Failed to batch save tokens {e}"
+            logger.error(error)
+            raise Exception(error)
+
     async def batch_save_tokens_in_dict(self, token: list[dict]):
         try:
-            insert_stmt = insert(self.token).values(token)
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.batch_upsert(self.token, token)
 
         except Exception as e:
             error = f"Pgsql::batch_save_tokens_in_dict: Failed to save token {e}"
@@ -342,13 +796,7 @@ class Pgsql(Interface):
 
     async def save_events(self, events: list[Event]):
         try:
-            async with self.engine.acquire() as conn:
-                values_list = [vars(event) for event in events]
-                insert_stmt = insert(self.event).values(values_list)
-                on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                    index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-                )
-                await conn.execute(on_conflict_stmt)
+            await self.batch_upsert(self.event, [vars(event) for event in events])
 
         except Exception as e:
             error = f"Pgsql::save_events: Failed to save events {e}"
@@ -357,12 +805,7 @@ class Pgsql(Interface):
 
     async def save_event(self, event: Event):
         try:
-            insert_stmt = insert(self.event).values(vars(event))
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.upsert(self.event, vars(event))
 
         except Exception as e:
             error = f"Pgsql::save_event: Failed to save event {e}"
@@ -371,28 +814,30 @@ class Pgsql(Interface):
 
     async def save_pending_inscription(self, pending_inscription: Pending_Inscriptions):
         try:
-            insert_stmt = insert(self.pending_inscriptions).values(
-                vars(pending_inscription)
-            )
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.upsert(self.pending_inscriptions, vars(pending_inscription))
 
         except Exception as e:
             error = f"Pgsql::save_pending_inscription: Failed to save pending inscription {e}"
             logger.error(error)
             raise Exception(error)
 
-    async def save_balance(self, balance: Balance):
+    async def batch_save_pending_inscriptions(
+        self, pending_inscriptions: list[Pending_Inscriptions]
+    ):
         try:
-            insert_stmt = insert(self.balance).values(vars(balance))
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
+            await self.batch_upsert(
+                self.pending_inscriptions,
+                [vars(pending_inscription) for pending_inscription in pending_inscriptions],
             )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+
+        except Exception as e:
+            error = f"Pgsql::batch_save_pending_inscriptions: Failed to batch save pending inscriptions {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def save_balance(self, balance: Balance):
+        try:
+            await self.upsert(self.balance, vars(balance))
 
         except Exception as e:
             error = f"Pgsql::save_balance: Failed to save balance {e}"
@@ -403,12 +848,7 @@ class Pgsql(Interface):
         new_balances = [vars(balance) for balance in balances]
 
         try:
-            insert_stmt = insert(self.balance).values(new_balances)
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.batch_upsert(self.balance, new_balances)
 
         except Exception as e:
             error = f"Pgsql::batch_save_balances: Failed to batch save balances {e}"
@@ -417,12 +857,7 @@ class Pgsql(Interface):
 
     async def batch_save_balances_in_dict(self, balances: list[dict]):
         try:
-            insert_stmt = insert(self.balance).values(balances)
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.batch_upsert(self.balance, balances)
 
         except Exception as e:
             error = (
@@ -433,39 +868,141 @@ class Pgsql(Interface):
 
     async def save_otc(self, otc: OTC):
         try:
-            insert_stmt = insert(self.otc).values(vars(otc))
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.upsert(self.otc, vars(otc))
 
         except Exception as e:
             error = f"Pgsql::save_otc: Failed to save otc {e}"
             logger.error(error)
             raise Exception(error)
 
+    async def batch_save_otcs(self, otcs: list[OTC]):
+        try:
+            await self.batch_upsert(self.otc, [vars(otc) for otc in otcs])
+
+        except Exception as e:
+            error = f"Pgsql::batch_save_otcs: Failed to batch save otcs {e}"
+            logger.error(error)
+            raise Exception(error)
+
     async def save_otc_record(self, otc_record: OTC_Record):
         try:
-            insert_stmt = insert(self.otc_record).values(vars(otc_record))
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.upsert(self.otc_record, vars(otc_record))
 
         except Exception as e:
             error = f"Pgsql::save_otc_record: Failed to save otc record {e}"
             logger.error(error)
             raise Exception(error)
 
+    async def batch_save_otc_records(self, otc_records: list[OTC_Record]):
+        try:
+            await self.batch_upsert(
+                self.otc_record, [vars(otc_record) for otc_record in otc_records]
+            )
+
+        except Exception as e:
+            error = f"Pgsql::batch_save_otc_records: Failed to batch save otc records {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def save_undo_logs(self, undo_logs: list[Undo_Log]):
+        values = []
+        for undo_log in undo_logs:
+            value = vars(undo_log).copy()
+            if undo_log.image is not None:
+                value["image"] = {
+                    key: str(item) if isinstance(item, Decimal) else item
+                    for key, item in undo_log.image.items()
+                }
+            values.append(value)
+
+        try:
+            await self.batch_upsert(self.undo_log, values)
+
+        except Exception as e:
+            error = f"Pgsql::save_undo_logs: Failed to save undo logs {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def prune_undo_logs(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    self.undo_log.delete().where(
+                        self.undo_log.c.block_height <= block_height - self.undo_depth
+                    )
+                )
+        except Exception as e:
+            error = f"Pgsql::prune_undo_logs: Failed to prune undo logs {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def rollback_to_block(self, block_height: int) -> bool:
+        last_block_height = await self.get_backup_block_height()
+        if last_block_height is None or block_height < last_block_height - self.undo_depth:
+            return False
+        if block_height >= last_block_height:
+            return True
+
+        await self.begin_block(block_height)
+        try:
+            async with self.acquire() as conn:
+                query = (
+                    self.undo_log.select()
+                    .where(self.undo_log.c.block_height > block_height)
+                    .order_by(self.undo_log.c.block_height, self.undo_log.c.seq)
+                )
+                result = await conn.execute(query)
+                records = await result.fetchall()
+
+            # the oldest image of a row is its state at block_height
+            images = {}
+            for record in records:
+                images.setdefault((record["table_name"], record["row_id"]), record["image"])
+
+            for table_name, table in self.state_tables.items():
+                rows = []
+                deleted_ids = []
+                for (image_table_name, row_id), image in images.items():
+                    if image_table_name != table_name:
+                        continue
+                    if image is not None:
+                        rows.append(image)
+                    elif isinstance(table.c.id.type, sa.BigInteger):
+                        deleted_ids.append(int(row_id))
+                    else:
+                        deleted_ids.append(row_id)
+
+                await self.batch_upsert(table, rows)
+                if deleted_ids:
+                    async with self.acquire() as conn:
+                        await conn.execute(table.delete().where(table.c.id.in_(deleted_ids)))
+
+            async with self.acquire() as conn:
+                await conn.execute(
+                    self.undo_log.delete().where(self.undo_log.c.block_height > block_height)
+                )
+            await self.mark_blocks_as_unapplied(block_height)
+            await self.mark_backup_block_height(block_height)
+            await self.commit_block(block_height)
+        except Exception as e:
+            await self.abort_block(block_height)
+            error = f"Pgsql::rollback_to_block: Failed to rollback to block {block_height} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+        logger.info(
+            f"Pgsql::rollback_to_block: rolled back {len(images)} rows from block {last_block_height} to {block_height}"
+        )
+        return True
+
     # ==================== get ====================
 
     async def get_token(self, token_id: int) -> Union[Token, None]:
         try:
-            async with self.engine.acquire() as conn:
-                query = self.token.select().where(self.token.c.id == token_id)
-                result = await conn.execute(query)
+            async with self.acquire() as conn:
+                result = await self.execute_prepared(
+                    conn, "select_token_by_id", {"value": token_id}
+                )
                 token = await result.fetchone()
                 if token is None:
                     return None
@@ -479,11 +1016,10 @@ class Pgsql(Interface):
         self, address: str
     ) -> Union[Pending_Inscriptions, None]:
         try:
-            async with self.engine.acquire() as conn:
-                query = self.pending_inscriptions.select().where(
-                    self.pending_inscriptions.c.id == address
+            async with self.acquire() as conn:
+                result = await self.execute_prepared(
+                    conn, "select_pending_inscriptions_by_id", {"value": address}
                 )
-                result = await conn.execute(query)
                 pending_inscriptions = await result.fetchone()
                 if pending_inscriptions is None:
                     return None
@@ -496,9 +1032,10 @@ class Pgsql(Interface):
     async def get_balance(self, address: str, token_id: int) -> Union[Balance, None]:
         balance_id = f"{address}-{token_id}"
         try:
-            async with self.engine.acquire() as conn:
-                query = self.balance.select().where(self.balance.c.id == balance_id)
-                result = await conn.execute(query)
+            async with self.acquire() as conn:
+                result = await self.execute_prepared(
+                    conn, "select_balance_by_id", {"value": balance_id}
+                )
                 balance = await result.fetchone()
                 if balance is None:
                     return None
@@ -510,9 +1047,10 @@ class Pgsql(Interface):
 
     async def get_otc(self, otc_id: int) -> Union[OTC, None]:
         try:
-            async with self.engine.acquire() as conn:
-                query = self.otc.select().where(self.otc.c.id == otc_id)
-                result = await conn.execute(query)
+            async with self.acquire() as conn:
+                result = await self.execute_prepared(
+                    conn, "select_otc_by_id", {"value": otc_id}
+                )
                 otc = await result.fetchone()
                 if otc is None:
                     return None
@@ -524,9 +1062,10 @@ class Pgsql(Interface):
 
     async def get_otc_records(self, oid: int) -> Union[list[OTC_Record], None]:
         try:
-            async with self.engine.acquire() as conn:
-                query = self.otc_record.select().where(self.otc_record.c.oid == oid)
-                result = await conn.execute(query)
+            async with self.acquire() as conn:
+                result = await self.execute_prepared(
+                    conn, "select_otc_record_by_oid", {"value": oid}
+                )
                 otc_records = await result.fetchall()
                 if otc_records is None:
                     return None
@@ -545,26 +1084,158 @@ class Pgsql(Interface):
         self, block_height
     ) -> Union[list[Event], None]:
         try:
-            async with self.engine.acquire() as conn:
-                query = self.event.select().where(
-                    self.event.c.block_height == block_height
+            async with self.acquire() as conn:
+                result = await self.execute_prepared(
+                    conn, "select_event_by_block_height", {"value": block_height}
                 )
-                result = await conn.execute(query)
                 events = await result.fetchall()
                 if events is None:
                     return None
 
-                ret_events = [Event(**event) for event in events]
-                sorted_ret_events = sorted(ret_events, key=lambda x: x.block_index)
-                return sorted_ret_events
+                return [Event(**event) for event in events]
         except Exception as e:
             error = f"Pgsql::get_events_by_block_height: Failed to get events {e}"
             logger.error(error)
             raise Exception(error)
 
+    async def get_events_by_block_range(
+        self, start_block_height: int, end_block_height: int
+    ) -> AsyncIterator[Event]:
+        """
+        Stream the events of a range of blocks through a server-side cursor.
+
+        The cursor lives in a transaction of its own connection, so the iterator must not
+        be consumed from inside a block.
+
+        Args:
+            start_block_height (int): The first block height of the range.
+            end_block_height (int): The block height the range stops before.
+
+        Yields:
+            Event: The events ordered by block height and block index.
+        """
+        try:
+            async with self.acquire() as conn:
+                async with conn.begin():
+                    await conn.execute(
+                        f"DECLARE event_range NO SCROLL CURSOR FOR {self.select_events_by_block_range_sql}",
+                        {"start": start_block_height, "end": end_block_height},
+                    )
+                    while True:
+                        result = await conn.execute(
+                            f"FETCH FORWARD {self.fetch_size} FROM event_range"
+                        )
+                        events = await result.fetchall()
+                        if not events:
+                            break
+                        for event in events:
+                            yield Event(**event)
+        except Exception as e:
+            error = f"Pgsql::get_events_by_block_range: Failed to get events {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def save_orc20_inscriptions(self, block_height: int, inscription_ids: List[str]):
+        if not inscription_ids:
+            return
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    'INSERT INTO "orc20_inscription" ("id", "block_height") '
+                    "SELECT unnest(%(inscription_ids)s::varchar[]), %(block_height)s "
+                    'ON CONFLICT ("id") DO NOTHING',
+                    {"inscription_ids": inscription_ids, "block_height": block_height},
+                )
+        except Exception as e:
+            error = f"Pgsql::save_orc20_inscriptions: Failed to save orc20 inscriptions of block {block_height} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_orc20_inscription_ids(self) -> AsyncIterator[str]:
+        """
+        Stream the ids of the registered orc-20 inscriptions through a server-side cursor.
+
+        Yields:
+            str: The inscription ids.
+        """
+        try:
+            async with self.acquire() as conn:
+                async with conn.begin():
+                    await conn.execute(
+                        'DECLARE orc20_inscription_ids NO SCROLL CURSOR FOR SELECT "id" FROM "orc20_inscription"'
+                    )
+                    while True:
+                        result = await conn.execute(
+                            f"FETCH FORWARD {self.fetch_size} FROM orc20_inscription_ids"
+                        )
+                        records = await result.fetchall()
+                        if not records:
+                            break
+                        for record in records:
+                            yield record["id"]
+        except Exception as e:
+            error = f"Pgsql::get_orc20_inscription_ids: Failed to get orc20 inscriptions {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def notify_block_events(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    "SELECT pg_notify(%(channel)s, %(payload)s)",
+                    {"channel": self.block_events_channel, "payload": str(block_height)},
+                )
+        except Exception as e:
+            error = f"Pgsql::notify_block_events: Failed to notify block {block_height} events {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def wait_block_events(
+        self, timeout: float, after: Union[int, None] = None
+    ) -> Union[int, None]:
+        """
+        Wait until the event indexer notifies that it produced the events of a block.
+
+        The listening connection is taken from the pool on the first wait and kept until
+        `close`, so it holds one of the `PGSQL_POOL_MAXSIZE` connections. Notifications
+        keep queuing on it while the blocks are handled; the queued ones not above `after`
+        are stale and skipped. Notifications sent before the first wait are lost, so
+        callers keep polling and use this as a wake-up only.
+
+        Args:
+            timeout (float): The number of seconds to wait at most.
+            after (Union[int, None], optional): The last block height handled.
+
+        Returns:
+            Union[int, None]: The notified block height, None on timeout.
+        """
+        try:
+            if self.listen_conn is None:
+                self.listen_conn = await metrics.acquire_connection(
+                    "pgsql", self.engine.acquire, self.pool_timeout
+                )
+                await self.listen_conn.execute(f'LISTEN "{self.block_events_channel}"')
+            notifies = self.listen_conn.connection.notifies
+            while not notifies.empty():
+                block_height = int(notifies.get_nowait().payload)
+                if after is None or block_height > after:
+                    return block_height
+            notify = await asyncio.wait_for(notifies.get(), timeout)
+            return int(notify.payload)
+        except asyncio.TimeoutError:
+            return None
+        except Exception as e:
+            if self.listen_conn is not None:
+                conn = self.listen_conn
+                self.listen_conn = None
+                await metrics.release_connection("pgsql", lambda conn: conn.close(), conn)
+            error = f"Pgsql::wait_block_events: Failed to wait block events {e}"
+            logger.error(error)
+            raise Exception(error)
+
     async def get_backup_block_height(self):
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 query = self.backup_height.select()
                 result = await conn.execute(query)
                 record = await result.fetchone()
@@ -578,22 +1249,35 @@ class Pgsql(Interface):
 
     async def mark_backup_block_height(self, backup_block_height):
         try:
-            insert_stmt = insert(self.backup_height).values(vars(Backup_Height(1, backup_block_height)))
-            on_conflict_stmt = insert_stmt.on_conflict_do_update(
-                index_elements=["id"], set_={c.name: c for c in insert_stmt.excluded}
-            )
-            async with self.engine.acquire() as conn:
-                await conn.execute(on_conflict_stmt)
+            await self.upsert(self.backup_height, vars(Backup_Height(1, backup_block_height)))
         except Exception as e:
-            error = f"Pgsql::get_backup_block_height: Failed to get backup height {e}"
+            error = f"Pgsql::mark_backup_block_height: Failed to mark backup height {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def delete_backup_block_height(self):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(self.backup_height.delete())
+        except Exception as e:
+            error = f"Pgsql::delete_backup_block_height: Failed to delete backup height {e}"
             logger.error(error)
             raise Exception(error)
 
     async def delete_event_by_block(self, block_height):
         try:
-            async with self.engine.acquire() as conn:
-                delete_ = self.event.delete().where(self.event.c.block_height >= block_height)
-                await conn.execute(delete_)
+            async with self.acquire() as conn:
+                async with conn.begin():
+                    delete_ = self.event.delete().where(self.event.c.block_height >= block_height)
+                    await conn.execute(delete_)
+                    await conn.execute(
+                        self.block_status.delete().where(self.block_status.c.id >= block_height)
+                    )
+                    await conn.execute(
+                        self.orc20_inscription.delete().where(
+                            self.orc20_inscription.c.block_height >= block_height
+                        )
+                    )
         except Exception as e:
             error = f"Pgsql::delete_event_by_block: Failed to delete event by height {e}"
             logger.error(error)
@@ -601,8 +1285,8 @@ class Pgsql(Interface):
 
     async def get_min_unhandled_block_height(self):
         try:
-            async with self.engine.acquire() as conn:
-                query = self.event.select().with_only_columns([func.min(self.event.c.block_height).label('block_height')]).where(self.event.c.handled == False)
+            async with self.acquire() as conn:
+                query = self.block_status.select().with_only_columns([func.min(self.block_status.c.id).label('block_height')]).where(self.block_status.c.applied == False)
                 result = await conn.execute(query)
                 record = await result.fetchone()
                 if not record:
@@ -615,7 +1299,7 @@ class Pgsql(Interface):
 
     async def mark_block_events_as_unhandled(self, block_height: int):
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 update = self.event.update().where(
                     self.event.c.block_height == block_height
                 ).values(handled=False)
@@ -627,8 +1311,8 @@ class Pgsql(Interface):
 
     async def get_max_event_block(self) -> Union[int, None]:
         try:
-            async with self.engine.acquire() as conn:
-                query = self.event.select().with_only_columns([func.max(self.event.c.block_height).label('block_height')])
+            async with self.acquire() as conn:
+                query = self.block_status.select().with_only_columns([func.max(self.block_status.c.id).label('block_height')]).where(self.block_status.c.produced == True)
                 result = await conn.execute(query)
                 record = await result.fetchone()
                 if not record:
@@ -639,9 +1323,47 @@ class Pgsql(Interface):
             logger.error(error)
             raise Exception(error)
 
+    async def mark_block_produced(self, block_height: int, event_count: int):
+        try:
+            await self.upsert(
+                self.block_status,
+                vars(Block_Status(block_height, event_count, True, False, int(time.time()))),
+            )
+        except Exception as e:
+            error = f"Pgsql::mark_block_produced: Failed to mark block {block_height} produced {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def mark_block_applied(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    self.block_status.update()
+                    .where(self.block_status.c.id == block_height)
+                    .values(applied=True, applied_time=int(time.time()))
+                )
+        except Exception as e:
+            error = f"Pgsql::mark_block_applied: Failed to mark block {block_height} applied {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def mark_blocks_as_unapplied(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    self.block_status.update()
+                    .where(self.block_status.c.id > block_height)
+                    .where(self.block_status.c.applied == True)
+                    .values(applied=False, applied_time=None)
+                )
+        except Exception as e:
+            error = f"Pgsql::mark_blocks_as_unapplied: Failed to mark blocks above {block_height} unapplied {e}"
+            logger.error(error)
+            raise Exception(error)
+
     async def get_max_handled_block_height(self):
         try:
-            async with self.engine.acquire() as conn:
+            async with self.acquire() as conn:
                 query = self.event.select().with_only_columns(
                     [func.min(self.event.c.block_height).label('block_height')]).where(self.event.c.handled == True)
                 result = await conn.execute(query)
@@ -656,13 +1378,14 @@ class Pgsql(Interface):
 
     async def is_block_handled(self, block_height) -> bool:
         try:
-            async with self.engine.acquire() as conn:
-                return await conn.scalar(select([func.count(self.event.c.id)])
-                .where(
-                    self.event.c.block_height == block_height
-                ).where(
-                    self.event.c.handled == False
-                )) == 0
+            async with self.acquire() as conn:
+                applied = await conn.scalar(
+                    select([self.block_status.c.applied]).where(
+                        self.block_status.c.id == block_height
+                    )
+                )
+                # a block without status has no event to handle
+                return applied is not False
         except Exception as e:
             error = f"Pgsql::is_block_handled: Failed to detect block height is handled or not {e}"
             logger.error(error)
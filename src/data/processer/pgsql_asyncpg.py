@@ -0,0 +1,751 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from decimal import Decimal
+from contextlib import asynccontextmanager
+from environs import Env
+from typing import Union, List, AsyncIterator
+import sqlalchemy as sa
+from sqlalchemy.sql.ddl import CreateTable, CreateIndex
+from sqlalchemy.dialects import postgresql
+from loguru import logger
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src import metrics
+from src.data.processer.pgsql import Pgsql, column_default
+from src.structure import Event, Token, Balance, Pending_Inscriptions, OTC, OTC_Record
+
+
+def column_encoder(column):
+    """
+    Get the function converting a Python value to what asyncpg expects for a column.
+
+    Snapshot rows and undo images carry numbers as strings or floats, which the binary
+    protocol refuses, so they are converted up front.
+    """
+    if isinstance(column.type, sa.Numeric):
+        return (
+            lambda value: value if isinstance(value, Decimal) else Decimal(str(value))
+        )
+    if isinstance(column.type, sa.Integer):
+        return int
+    return None
+
+
+class AsyncPgsql(Pgsql):
+    """
+    Data processer on top of asyncpg.
+
+    It shares the schema of `Pgsql` but talks the binary protocol: statements are prepared
+    and cached per connection by asyncpg, batches go through `executemany`, bulk loads
+    through `copy_records_to_table`, and records are decoded straight into the structures.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pool = None
+        self.sqls = {}
+
+    # ==================== initialize ====================
+
+    async def init(self):
+        # imported here so that the default backend does not need asyncpg installed
+        import asyncpg
+
+        env = Env()
+        env.read_env()
+        self.connect_kwargs = dict(
+            user=env.str("PGSQL_USER"),
+            password=env.str("PGSQL_PASSWD"),
+            database=env.str("PGSQL_DB"),
+            host=env.str("PGSQL_HOST"),
+            port=env.int("PGSQL_PORT"),
+        )
+        # milliseconds, 0 disables it
+        statement_timeout = env.int("PGSQL_STATEMENT_TIMEOUT", 0)
+        self.pool_timeout = env.float("PGSQL_POOL_ACQUIRE_TIMEOUT", 60)
+        self.pool = await asyncpg.create_pool(
+            min_size=env.int("PGSQL_POOL_MINSIZE", 1),
+            max_size=env.int("PGSQL_POOL_MAXSIZE", 10),
+            server_settings={"statement_timeout": str(statement_timeout)},
+            init=self.init_connection,
+            **self.connect_kwargs,
+        )
+        self.compile_statements()
+
+    async def init_connection(self, conn):
+        await conn.set_type_codec(
+            "json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+
+    async def close(self):
+        try:
+            if self.listen_conn is not None:
+                conn = self.listen_conn
+                self.listen_conn = None
+                await conn.remove_listener(
+                    self.block_events_channel, self.queue_block_events
+                )
+                await metrics.release_connection("pgsql", self.pool.release, conn)
+            await self.pool.close()
+        except Exception as e:
+            error = f"AsyncPgsql::close: Failed close database connection {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    def compile_statements(self):
+        self.sqls = {}
+        self.binds = {}
+
+        for table in [
+            self.event,
+            self.token,
+            self.balance,
+            self.pending_inscriptions,
+            self.otc,
+            self.otc_record,
+            self.backup_height,
+            self.undo_log,
+            self.block_status,
+        ]:
+            columns = [column.name for column in table.columns]
+            quoted_columns = ", ".join(f'"{column}"' for column in columns)
+            placeholders = ", ".join(f"${index + 1}" for index in range(len(columns)))
+            updates = ", ".join(
+                f'"{column}" = EXCLUDED."{column}"' for column in columns
+            )
+            self.sqls[f"upsert_{table.name}"] = (
+                f'INSERT INTO "{table.name}" ({quoted_columns}) '
+                f'VALUES ({placeholders}) ON CONFLICT ("id") DO UPDATE SET {updates}'
+            )
+            self.binds[table.name] = [
+                (column.name, column_default(column), column_encoder(column))
+                for column in table.columns
+            ]
+
+        for table, key in [
+            (self.token, "id"),
+            (self.balance, "id"),
+            (self.pending_inscriptions, "id"),
+            (self.otc, "id"),
+            (self.otc_record, "oid"),
+        ]:
+            quoted_columns = ", ".join(f'"{column.name}"' for column in table.columns)
+            self.sqls[
+                f"select_{table.name}_by_{key}"
+            ] = f'SELECT {quoted_columns} FROM "{table.name}" WHERE "{key}" = $1'
+
+        quoted_columns = ", ".join(f'"{column.name}"' for column in self.event.columns)
+        self.sqls[
+            "select_event_by_block_height"
+        ] = f'SELECT {quoted_columns} FROM "event" WHERE "block_height" = $1 ORDER BY "block_index"'
+        self.sqls["select_events_by_block_range"] = (
+            f'SELECT {quoted_columns} FROM "event" WHERE "block_height" >= $1 AND "block_height" < $2 '
+            f'ORDER BY "block_height", "block_index"'
+        )
+
+    def bind(self, table, value: dict) -> tuple:
+        params = []
+        for name, default, encoder in self.binds[table.name]:
+            item = value.get(name, default)
+            if encoder is not None and item is not None:
+                item = encoder(item)
+            params.append(item)
+        return tuple(params)
+
+    def ddl(self, element) -> str:
+        return str(element.compile(dialect=postgresql.dialect()))
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.block_conn is None:
+            async with metrics.pooled(
+                "pgsql", self.pool.acquire, self.pool.release, self.pool_timeout
+            ) as conn:
+                yield conn
+        else:
+            # a connection runs one statement at a time
+            async with self.block_lock:
+                yield self.block_conn
+
+    # ==================== block ====================
+
+    async def begin_block(self, block_height: int):
+        try:
+            self.block_conn = await metrics.acquire_connection(
+                "pgsql", self.pool.acquire, self.pool_timeout
+            )
+            self.block_transaction = self.block_conn.transaction()
+            await self.block_transaction.start()
+        except Exception as e:
+            await self.release_block_conn()
+            error = f"AsyncPgsql::begin_block: Failed to begin block {block_height} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def commit_block(self, block_height: int):
+        try:
+            await self.block_transaction.commit()
+        except Exception as e:
+            error = (
+                f"AsyncPgsql::commit_block: Failed to commit block {block_height} {e}"
+            )
+            logger.error(error)
+            raise Exception(error)
+        finally:
+            await self.release_block_conn()
+
+    async def abort_block(self, block_height: int):
+        try:
+            if self.block_transaction is not None:
+                await self.block_transaction.rollback()
+        except Exception as e:
+            error = (
+                f"AsyncPgsql::abort_block: Failed to rollback block {block_height} {e}"
+            )
+            logger.error(error)
+        finally:
+            await self.release_block_conn()
+
+    async def release_block_conn(self):
+        conn = self.block_conn
+        self.block_conn = None
+        self.block_transaction = None
+        if conn is not None:
+            await metrics.release_connection("pgsql", self.pool.release, conn)
+
+    # ==================== tables ====================
+
+    async def backup_table(self, origin_table_name, index_list=[]):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    f'DROP TABLE IF EXISTS "{origin_table_name}_backup" CASCADE'
+                )
+                await conn.execute(
+                    f'CREATE TABLE "{origin_table_name}_backup" AS SELECT * FROM {origin_table_name};'
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::backup_table: Failed to backup table {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def restore_table(self, origin_table_name):
+        try:
+            async with self.acquire() as conn:
+                result = await conn.fetchval(
+                    "SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema = 'public' AND table_name = $1)",
+                    f"{origin_table_name}_backup",
+                )
+                if bool(result):
+                    await conn.execute(
+                        f"ALTER TABLE {origin_table_name} RENAME TO {origin_table_name}_temp;"
+                    )
+                    await conn.execute(
+                        f"ALTER TABLE {origin_table_name}_backup RENAME TO {origin_table_name};"
+                    )
+                    await conn.execute(f"DROP TABLE {origin_table_name}_temp;")
+        except Exception as e:
+            error = f"AsyncPgsql::restore_table: Failed to restore table {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def clear_table(self, table, table_name, index_list=[]):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(f'DROP TABLE IF EXISTS "{table_name}" CASCADE')
+                await conn.execute(self.ddl(CreateTable(table, if_not_exists=True)))
+                for index in index_list:
+                    await conn.execute(self.ddl(CreateIndex(index, if_not_exists=True)))
+        except Exception as e:
+            error = f"AsyncPgsql::clear_table: Failed to drop and create tables {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def create_table(self, table, index_list=[]):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(self.ddl(CreateTable(table, if_not_exists=True)))
+                for index in index_list:
+                    await conn.execute(self.ddl(CreateIndex(index, if_not_exists=True)))
+        except Exception as e:
+            error = f"AsyncPgsql::create_table: Failed to create tables {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    # ==================== bulk load ====================
+
+    async def bulk_load(self, table, table_name, rows, index_list=[]):
+        try:
+            start = time.time()
+            columns = [column.name for column in table.columns]
+            count = 0
+            async with self.acquire() as conn:
+                await conn.execute(f'DROP TABLE IF EXISTS "{table_name}" CASCADE')
+                await conn.execute(self.ddl(CreateTable(table)))
+
+                records = []
+                for row in rows:
+                    records.append(self.bind(table, row))
+                    if len(records) == self.copy_size:
+                        await conn.copy_records_to_table(
+                            table_name, records=records, columns=columns
+                        )
+                        count += len(records)
+                        records = []
+                if records:
+                    await conn.copy_records_to_table(
+                        table_name, records=records, columns=columns
+                    )
+                    count += len(records)
+
+                for index in index_list:
+                    await conn.execute(self.ddl(CreateIndex(index, if_not_exists=True)))
+
+            elapsed = max(time.time() - start, 1e-6)
+            logger.info(
+                f"AsyncPgsql::bulk_load: loaded {count} rows into {table_name} in {elapsed:.2f}s ({count / elapsed:.0f} rows/s)"
+            )
+        except Exception as e:
+            error = f"AsyncPgsql::bulk_load: Failed to bulk load {table_name} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    # ==================== save ====================
+
+    async def upsert(self, table, value: dict):
+        async with self.acquire() as conn:
+            await conn.execute(
+                self.sqls[f"upsert_{table.name}"], *self.bind(table, value)
+            )
+
+    async def batch_upsert(self, table, values: list[dict]):
+        if not values:
+            return
+        sql = self.sqls[f"upsert_{table.name}"]
+        for index in range(0, len(values), self.batch_size):
+            chunk = values[index : index + self.batch_size]
+            async with self.acquire() as conn:
+                await conn.executemany(
+                    sql, [self.bind(table, value) for value in chunk]
+                )
+
+    async def prune_undo_logs(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    'DELETE FROM "undo_log" WHERE "block_height" <= $1',
+                    block_height - self.undo_depth,
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::prune_undo_logs: Failed to prune undo logs {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def rollback_to_block(self, block_height: int) -> bool:
+        last_block_height = await self.get_backup_block_height()
+        if (
+            last_block_height is None
+            or block_height < last_block_height - self.undo_depth
+        ):
+            return False
+        if block_height >= last_block_height:
+            return True
+
+        await self.begin_block(block_height)
+        try:
+            async with self.acquire() as conn:
+                records = await conn.fetch(
+                    'SELECT "table_name", "row_id", "image" FROM "undo_log" WHERE "block_height" > $1 ORDER BY "block_height", "seq"',
+                    block_height,
+                )
+
+            # the oldest image of a row is its state at block_height
+            images = {}
+            for record in records:
+                images.setdefault(
+                    (record["table_name"], record["row_id"]), record["image"]
+                )
+
+            for table_name, table in self.state_tables.items():
+                rows = []
+                deleted_ids = []
+                for (image_table_name, row_id), image in images.items():
+                    if image_table_name != table_name:
+                        continue
+                    if image is not None:
+                        rows.append(image)
+                    elif isinstance(table.c.id.type, sa.BigInteger):
+                        deleted_ids.append(int(row_id))
+                    else:
+                        deleted_ids.append(row_id)
+
+                await self.batch_upsert(table, rows)
+                if deleted_ids:
+                    async with self.acquire() as conn:
+                        await conn.execute(
+                            f'DELETE FROM "{table_name}" WHERE "id" = ANY($1)',
+                            deleted_ids,
+                        )
+
+            async with self.acquire() as conn:
+                await conn.execute(
+                    'DELETE FROM "undo_log" WHERE "block_height" > $1', block_height
+                )
+            await self.mark_blocks_as_unapplied(block_height)
+            await self.mark_backup_block_height(block_height)
+            await self.commit_block(block_height)
+        except Exception as e:
+            await self.abort_block(block_height)
+            error = f"AsyncPgsql::rollback_to_block: Failed to rollback to block {block_height} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+        logger.info(
+            f"AsyncPgsql::rollback_to_block: rolled back {len(images)} rows from block {last_block_height} to {block_height}"
+        )
+        return True
+
+    # ==================== get ====================
+
+    async def get_token(self, token_id: int) -> Union[Token, None]:
+        try:
+            async with self.acquire() as conn:
+                token = await conn.fetchrow(self.sqls["select_token_by_id"], token_id)
+                if token is None:
+                    return None
+                return Token(**token)
+        except Exception as e:
+            error = f"AsyncPgsql::get_token: Failed to get token {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_pending_inscription(
+        self, address: str
+    ) -> Union[Pending_Inscriptions, None]:
+        try:
+            async with self.acquire() as conn:
+                pending_inscriptions = await conn.fetchrow(
+                    self.sqls["select_pending_inscriptions_by_id"], address
+                )
+                if pending_inscriptions is None:
+                    return None
+                return Pending_Inscriptions(**pending_inscriptions)
+        except Exception as e:
+            error = f"AsyncPgsql::get_pending_inscription: Failed to get pending inscriptions {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_balance(self, address: str, token_id: int) -> Union[Balance, None]:
+        balance_id = f"{address}-{token_id}"
+        try:
+            async with self.acquire() as conn:
+                balance = await conn.fetchrow(
+                    self.sqls["select_balance_by_id"], balance_id
+                )
+                if balance is None:
+                    return None
+                return Balance(**balance)
+        except Exception as e:
+            error = f"AsyncPgsql::get_balance: Failed to get balance {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_otc(self, otc_id: int) -> Union[OTC, None]:
+        try:
+            async with self.acquire() as conn:
+                otc = await conn.fetchrow(self.sqls["select_otc_by_id"], otc_id)
+                if otc is None:
+                    return None
+                return OTC(**otc)
+        except Exception as e:
+            error = f"AsyncPgsql::get_otc: Failed to get otc {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_otc_records(self, oid: int) -> Union[list[OTC_Record], None]:
+        try:
+            async with self.acquire() as conn:
+                otc_records = await conn.fetch(
+                    self.sqls["select_otc_record_by_oid"], oid
+                )
+                return [OTC_Record(**otc_record) for otc_record in otc_records]
+        except Exception as e:
+            error = f"AsyncPgsql::get_otc_records: Failed to get otc records {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_events_by_block_height(
+        self, block_height
+    ) -> Union[list[Event], None]:
+        try:
+            async with self.acquire() as conn:
+                events = await conn.fetch(
+                    self.sqls["select_event_by_block_height"], block_height
+                )
+                return [Event(**event) for event in events]
+        except Exception as e:
+            error = f"AsyncPgsql::get_events_by_block_height: Failed to get events {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_events_by_block_range(
+        self, start_block_height: int, end_block_height: int
+    ) -> AsyncIterator[Event]:
+        try:
+            async with self.acquire() as conn:
+                async with conn.transaction():
+                    async for event in conn.cursor(
+                        self.sqls["select_events_by_block_range"],
+                        start_block_height,
+                        end_block_height,
+                        prefetch=self.fetch_size,
+                    ):
+                        yield Event(**event)
+        except Exception as e:
+            error = f"AsyncPgsql::get_events_by_block_range: Failed to get events {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def save_orc20_inscriptions(
+        self, block_height: int, inscription_ids: List[str]
+    ):
+        if not inscription_ids:
+            return
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    'INSERT INTO "orc20_inscription" ("id", "block_height") '
+                    'SELECT unnest($1::varchar[]), $2 ON CONFLICT ("id") DO NOTHING',
+                    inscription_ids,
+                    block_height,
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::save_orc20_inscriptions: Failed to save orc20 inscriptions of block {block_height} {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_orc20_inscription_ids(self) -> AsyncIterator[str]:
+        try:
+            async with self.acquire() as conn:
+                async with conn.transaction():
+                    async for record in conn.cursor(
+                        'SELECT "id" FROM "orc20_inscription"', prefetch=self.fetch_size
+                    ):
+                        yield record["id"]
+        except Exception as e:
+            error = f"AsyncPgsql::get_orc20_inscription_ids: Failed to get orc20 inscriptions {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def notify_block_events(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    "SELECT pg_notify($1, $2)",
+                    self.block_events_channel,
+                    str(block_height),
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::notify_block_events: Failed to notify block {block_height} events {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    def queue_block_events(self, conn, pid, channel, payload):
+        self.notifies.put_nowait(payload)
+
+    async def wait_block_events(
+        self, timeout: float, after: Union[int, None] = None
+    ) -> Union[int, None]:
+        try:
+            if self.listen_conn is None:
+                self.listen_conn = await metrics.acquire_connection(
+                    "pgsql", self.pool.acquire, self.pool_timeout
+                )
+                self.notifies = asyncio.Queue()
+                await self.listen_conn.add_listener(
+                    self.block_events_channel, self.queue_block_events
+                )
+            while not self.notifies.empty():
+                block_height = int(self.notifies.get_nowait())
+                if after is None or block_height > after:
+                    return block_height
+            payload = await asyncio.wait_for(self.notifies.get(), timeout)
+            return int(payload)
+        except asyncio.TimeoutError:
+            return None
+        except Exception as e:
+            if self.listen_conn is not None:
+                conn = self.listen_conn
+                self.listen_conn = None
+                await metrics.release_connection("pgsql", self.pool.release, conn)
+            error = f"AsyncPgsql::wait_block_events: Failed to wait block events {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_backup_block_height(self):
+        try:
+            async with self.acquire() as conn:
+                return await conn.fetchval(
+                    'SELECT "block_height" FROM "backup_height" LIMIT 1'
+                )
+        except Exception as e:
+            error = (
+                f"AsyncPgsql::get_backup_block_height: Failed to get backup height {e}"
+            )
+            logger.error(error)
+            raise Exception(error)
+
+    async def delete_backup_block_height(self):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute('DELETE FROM "backup_height"')
+        except Exception as e:
+            error = f"AsyncPgsql::delete_backup_block_height: Failed to delete backup height {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def init_block_status_table(self):
+        await self.create_table(self.block_status, self.block_status_index_list)
+        try:
+            async with self.acquire() as conn:
+                if await conn.fetchval('SELECT EXISTS (SELECT 1 FROM "block_status")'):
+                    return
+                await conn.execute(
+                    'INSERT INTO "block_status" ("id", "event_count", "produced", "applied", "produced_time") '
+                    'SELECT "block_height", count(*), true, bool_and("handled"), $1 '
+                    'FROM "event" GROUP BY "block_height"',
+                    int(time.time()),
+                )
+        except Exception as e:
+            error = (
+                f"AsyncPgsql::init_block_status_table: Failed to fill block status {e}"
+            )
+            logger.error(error)
+            raise Exception(error)
+
+    async def init_orc20_inscription_table(self):
+        await self.create_table(
+            self.orc20_inscription, self.orc20_inscription_index_list
+        )
+        try:
+            async with self.acquire() as conn:
+                if await conn.fetchval(
+                    'SELECT EXISTS (SELECT 1 FROM "orc20_inscription")'
+                ):
+                    return
+                await conn.execute(
+                    'INSERT INTO "orc20_inscription" ("id", "block_height") '
+                    'SELECT "inscription_id", min("block_height") FROM "event" '
+                    'WHERE "event_type" = \'INSCRIBE\' GROUP BY "inscription_id"'
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::init_orc20_inscription_table: Failed to fill orc20 inscriptions {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def delete_event_by_block(self, block_height):
+        try:
+            async with self.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(
+                        'DELETE FROM "event" WHERE "block_height" >= $1', block_height
+                    )
+                    await conn.execute(
+                        'DELETE FROM "block_status" WHERE "id" >= $1', block_height
+                    )
+                    await conn.execute(
+                        'DELETE FROM "orc20_inscription" WHERE "block_height" >= $1',
+                        block_height,
+                    )
+        except Exception as e:
+            error = f"AsyncPgsql::delete_event_by_block: Failed to delete event by height {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_min_unhandled_block_height(self):
+        try:
+            async with self.acquire() as conn:
+                return await conn.fetchval(
+                    'SELECT min("id") FROM "block_status" WHERE "applied" = false'
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::get_min_unhandled_block_height: Failed to min unhandled event height {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def mark_block_events_as_unhandled(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    'UPDATE "event" SET "handled" = false WHERE "block_height" = $1',
+                    block_height,
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::mark_block_events_as_unhandled: Failed to block height all events to unhandled {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_max_event_block(self) -> Union[int, None]:
+        try:
+            async with self.acquire() as conn:
+                return await conn.fetchval(
+                    'SELECT max("id") FROM "block_status" WHERE "produced" = true'
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::get_max_event_block: Failed to max event height {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def mark_block_applied(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    'UPDATE "block_status" SET "applied" = true, "applied_time" = $2 WHERE "id" = $1',
+                    block_height,
+                    int(time.time()),
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::mark_block_applied: Failed to mark block {block_height} applied {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def mark_blocks_as_unapplied(self, block_height: int):
+        try:
+            async with self.acquire() as conn:
+                await conn.execute(
+                    'UPDATE "block_status" SET "applied" = false, "applied_time" = NULL '
+                    'WHERE "id" > $1 AND "applied" = true',
+                    block_height,
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::mark_blocks_as_unapplied: Failed to mark blocks above {block_height} unapplied {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def get_max_handled_block_height(self):
+        try:
+            async with self.acquire() as conn:
+                return await conn.fetchval(
+                    'SELECT min("block_height") FROM "event" WHERE "handled" = true'
+                )
+        except Exception as e:
+            error = f"AsyncPgsql::get_max_handled_block_height: Failed to max handled event height {e}"
+            logger.error(error)
+            raise Exception(error)
+
+    async def is_block_handled(self, block_height) -> bool:
+        try:
+            async with self.acquire() as conn:
+                applied = await conn.fetchval(
+                    'SELECT "applied" FROM "block_status" WHERE "id" = $1', block_height
+                )
+                # a block without status has no event to handle
+                return applied is not False
+        except Exception as e:
+            error = f"AsyncPgsql::is_block_handled: Failed to detect block height is handled or not {e}"
+            logger.error(error)
+            raise Exception(error)
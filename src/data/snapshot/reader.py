@@ -0,0 +1,151 @@
+import json
+from typing import Iterator, Tuple
+
+
+class JsonStream:
+    """
+    Incremental reader over a JSON document.
+
+    Only the containers being walked are tracked, every leaf value is decoded on its own,
+    so memory depends on the size of the largest value instead of the whole document.
+
+    Attributes:
+        file: The text file being read.
+        chunk_size (int): The number of characters read from the file at once.
+    """
+
+    def __init__(self, file, chunk_size: int = 65536):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """
+        Read the next chunk, dropping what has already been consumed.
+
+        Returns:
+            bool: False if the end of the file was reached.
+        """
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character without consuming it.
+
+        Returns:
+            str: The next character, or "" at the end of the file.
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"expected {char!r} at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """
+        Decode the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a number running into the end of the buffer may continue in the next chunk,
+                # and one cut after "1." or "2e" decodes as its integer part up to there
+                if self.eof or (
+                    end < len(self.buffer) and self.buffer[end] not in ".eE"
+                ):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def iter_keys(self) -> Iterator[str]:
+        """
+        Walk the members of an object, yielding each key with the stream positioned on its value.
+
+        The caller must consume the value before asking for the next key.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"expected ',' or '}}' at offset {self.pos - 1}")
+
+    def iter_array(self) -> Iterator[object]:
+        """
+        Walk the items of an array, decoding them one at a time.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"expected ',' or ']' at offset {self.pos - 1}")
+
+
+def iter_items(file_path: str) -> Iterator[Tuple[str, object]]:
+    """
+    Stream the members of the top-level object of a JSON file.
+
+    Args:
+        file_path (str): The path of the JSON file.
+
+    Yields:
+        Tuple[str, object]: The key and the decoded value of each member.
+    """
+    with open(file_path, "r") as file:
+        stream = JsonStream(file)
+        for key in stream.iter_keys():
+            yield key, stream.value()
+
+
+def iter_nested_items(file_path: str) -> Iterator[Tuple[str, object]]:
+    """
+    Stream the items of the arrays held by the top-level object of a JSON file.
+
+    Args:
+        file_path (str): The path of the JSON file.
+
+    Yields:
+        Tuple[str, object]: The key of the array and one decoded item of it.
+    """
+    with open(file_path, "r") as file:
+        stream = JsonStream(file)
+        for key in stream.iter_keys():
+            for item in stream.iter_array():
+                yield key, item
@@ -32,21 +32,21 @@ async def handle_execute(event: Event, data_processer: DataProcesser) -> Event:
     if event.event_type != EventType.INSCRIBE:
         return error_event(event, "otc-execute event don't care about transfer")
 
-    (base_params, error) = execute_indexer.parse_params(event)
-    if base_params is None:
+    (params, error) = execute_indexer.parse_params(event)
+    if params is None:
         return error_event(event, f"Failed to parse inscription params: {error}")
 
-    event.function_id = base_params["oid"]
+    event.function_id = params.oid
 
     tasks = [
-        data_processer.get_otc(base_params["oid"]),
-        data_processer.get_otc_records(base_params["oid"]),
+        data_processer.get_otc(params.oid),
+        data_processer.get_otc_records(params.oid),
     ]
 
     (otc, records) = await asyncio.gather(*tasks)
 
     if otc is None:
-        return error_event(event, f"Failed to get otc: {base_params['oid']}")
+        return error_event(event, f"Failed to get otc: {params.oid}")
     if None in records:
         return error_event(event, "Failed to get all otc records")
 
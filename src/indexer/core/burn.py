@@ -4,9 +4,14 @@ from typing import Union, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token, Balance
-from src.indexer.utils.field import parse_amt
-from src.indexer.utils.commom import parse_tick_and_tid, amt_add, amt_sub
+from src.structure import Event, Token, Balance, Burn_Instruction
+from src.indexer.utils.commom import amt_add, amt_sub
+from src.indexer.utils.schema import compile_schema, tick, tid, tick_matched, amt
+
+
+base_schema = compile_schema(("tick", "tid", "amt"), (tick(), tid()))
+
+params_schema = compile_schema(None, (tick_matched(), amt()))
 
 
 def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
@@ -20,19 +25,12 @@ def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
         Tuple[Union[dict, None], str]: A tuple containing the parsed base parameters and an error message if any.
 
     """
-    params = event.content.get("params", {})
-
-    for key in params.keys():
-        if key not in ["tick", "tid", "amt"]:
-            error = "unknown key in params"
-            return None, error
-
-    return parse_tick_and_tid(event)
+    return base_schema(event.content.get("params", {}))
 
 
 def parse_params(
     event: Event, token: Token, base_params: dict
-) -> Tuple[Union[dict, None], str]:
+) -> Tuple[Union[Burn_Instruction, None], str]:
     """
     Parse the parameters from the event.
 
@@ -42,38 +40,31 @@ def parse_params(
         base_params (dict): The base parameters.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message if any.
+        Tuple[Union[Burn_Instruction, None], str]: A tuple containing the parsed instruction and an error message if any.
 
     """
-    if base_params["tick"] != token.tick:
-        error = "tick is not matched"
-        return None, error
-
-    params = event.content.get("params", {})
-
-    amt = parse_amt(params, token.dec, "amt", token.max)
-    if amt is None:
-        error = "invalid amt"
+    (values, error) = params_schema(
+        event.content.get("params", {}), token=token, base_params=base_params
+    )
+    if values is None:
         return None, error
 
-    base_params["amt"] = amt
-
-    return base_params, ""
+    return Burn_Instruction(base_params["tick"], base_params["tid"], values["amt"]), ""
 
 
-def is_valid_event(balance: Balance, params: dict) -> Tuple[bool, str]:
+def is_valid_event(balance: Balance, params: Burn_Instruction) -> Tuple[bool, str]:
     """
     Check if the event is valid.
 
     Args:
         balance (Balance): The balance object.
-        params (dict): The parameters.
+        params (Burn_Instruction): The parsed instruction.
 
     Returns:
         Tuple[bool, str]: A tuple containing a boolean indicating if the event is valid and an error message if any.
 
     """
-    if balance.available_balance < params["amt"]:
+    if balance.available_balance < params.amt:
         error = "burn amount is greater than available balance"
         return False, error
 
@@ -81,7 +72,7 @@ def is_valid_event(balance: Balance, params: dict) -> Tuple[bool, str]:
 
 
 def process_burn(
-    params: dict,
+    params: Burn_Instruction,
     token: Token,
     balance: Balance,
 ) -> Tuple[Token, Balance]:
@@ -89,7 +80,7 @@ def process_burn(
     Process the burn event.
 
     Args:
-        params (dict): The parameters.
+        params (Burn_Instruction): The parsed instruction.
         token (Token): The token object.
         balance (Balance): The balance object.
 
@@ -97,15 +88,15 @@ def process_burn(
         Tuple[Token, Balance]: A tuple containing the updated token and balance objects.
 
     """
-    balance.balance = amt_sub(balance.balance, params["amt"], token.dec)
+    balance.balance = amt_sub(balance.balance, params.amt, token.dec)
     balance.available_balance = amt_sub(
-        balance.available_balance, params["amt"], token.dec
+        balance.available_balance, params.amt, token.dec
     )
 
     if balance.balance == 0:
         token.holders -= 1
 
-    token.burned = amt_add(token.burned, params["amt"], token.dec)
-    token.circulating = amt_sub(token.circulating, params["amt"], token.dec)
+    token.burned = amt_add(token.burned, params.amt, token.dec)
+    token.circulating = amt_sub(token.circulating, params.amt, token.dec)
 
     return token, balance
@@ -4,18 +4,31 @@ from typing import Union, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token
-from src.indexer.utils.field import (
-    parse_tick,
-    parse_dec,
-    parse_max,
-    parse_lim,
-    parse_ug,
-    parse_mp,
+from src.structure import Event, Token, Deploy_Instruction
+from src.indexer.utils.field import parse_dec, parse_max, parse_lim, parse_ug, parse_mp
+from src.indexer.utils.schema import Field, compile_schema, tick
+
+
+params_schema = compile_schema(
+    ("tick", "max", "lim", "dec", "ug", "mp", "tid"),
+    (
+        tick(),
+        Field("dec", lambda params, scope: parse_dec(params), "invalid dec"),
+        Field(
+            "max", lambda params, scope: parse_max(params, scope["dec"]), "invalid max"
+        ),
+        Field(
+            "lim",
+            lambda params, scope: parse_lim(params, scope["dec"], scope["max"]),
+            "invalid lim",
+        ),
+        Field("ug", lambda params, scope: parse_ug(params), "invalid ug"),
+        Field("mp", lambda params, scope: parse_mp(params), "invalid mp"),
+    ),
 )
 
 
-def parse_params(event: Event) -> Tuple[Union[dict, None], str]:
+def parse_params(event: Event) -> Tuple[Union[Deploy_Instruction, None], str]:
     """
     Parse the parameters from the event content.
 
@@ -23,56 +36,23 @@ def parse_params(event: Event) -> Tuple[Union[dict, None], str]:
         event (Event): The event containing the parameters.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message if any.
+        Tuple[Union[Deploy_Instruction, None], str]: A tuple containing the parsed instruction and an error message if any.
 
     """
-    params = event.content.get("params", {})
-
-    for key in params.keys():
-        if key not in ["tick", "max", "lim", "dec", "ug", "mp", "tid"]:
-            error = "unknown key in params"
-            return None, error
-
-    tick = parse_tick(params)
-    if tick is None:
-        error = "invalid tick"
-        return None, error
-
-    dec = parse_dec(params)
-    if dec is None:
-        error = "invalid dec"
-        return None, error
-
-    max = parse_max(params, dec)
-    if max is None:
-        error = "invalid max"
-        return None, error
-
-    lim = parse_lim(params, dec, max)
-    if lim is None:
-        error = "invalid lim"
-        return None, error
-
-    ug = parse_ug(params)
-    if ug is None:
-        error = "invalid ug"
-        return None, error
-
-    mp = parse_mp(params)
-    if mp is None:
-        error = "invalid mp"
+    (values, error) = params_schema(event.content.get("params", {}))
+    if values is None:
         return None, error
 
-    return {"tick": tick, "dec": dec, "max": max, "lim": lim, "ug": ug, "mp": mp}, ""
+    return Deploy_Instruction(**values), ""
 
 
-def process_deploy(event: Event, params: dict) -> Token:
+def process_deploy(event: Event, params: Deploy_Instruction) -> Token:
     """
     Process the deployment of a token.
 
     Args:
         event (Event): The event triggering the deployment.
-        params (dict): The parsed parameters for the deployment.
+        params (Deploy_Instruction): The parsed instruction of the deployment.
 
     Returns:
         Token: The deployed token.
@@ -80,12 +60,12 @@ def process_deploy(event: Event, params: dict) -> Token:
     """
     token = Token(
         event.inscription_number,
-        params["tick"],
-        params["max"],
-        params["lim"],
-        params["dec"],
-        params["ug"],
-        params["mp"],
+        params.tick,
+        params.max,
+        params.lim,
+        params.dec,
+        params.ug,
+        params.mp,
         event.receiver,
         event.timestamp,
         event.inscription_id,
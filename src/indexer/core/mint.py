@@ -4,9 +4,14 @@ from typing import Union, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token, Balance
-from src.indexer.utils.field import parse_amt
-from src.indexer.utils.commom import parse_tick_and_tid, amt_add
+from src.structure import Event, Token, Balance, Mint_Instruction
+from src.indexer.utils.commom import amt_add
+from src.indexer.utils.schema import compile_schema, tick, tid, tick_matched, amt
+
+
+base_schema = compile_schema(("tick", "tid", "amt"), (tick(), tid()))
+
+params_schema = compile_schema(None, (tick_matched(), amt(bound="lim")))
 
 
 def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
@@ -18,21 +23,14 @@ def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
 
     Returns:
         Tuple[Union[dict, None], str]: A tuple containing the parsed base parameters and an error message (if any).
-    """
 
-    params = event.content.get("params", {})
-
-    for key in params.keys():
-        if key not in ["tick", "tid", "amt"]:
-            error = "unknown key in params"
-            return None, error
-
-    return parse_tick_and_tid(event)
+    """
+    return base_schema(event.content.get("params", {}))
 
 
 def parse_params(
     event: Event, token: Token, base_params: dict
-) -> Tuple[Union[dict, None], str]:
+) -> Tuple[Union[Mint_Instruction, None], str]:
     """
     Parse the parameters from the event.
 
@@ -42,33 +40,28 @@ def parse_params(
         base_params (dict): The base parameters.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message (if any).
-    """
-
-    if base_params["tick"] != token.tick:
-        error = "tick is not matched"
-        return None, error
-
-    params = event.content.get("params", {})
+        Tuple[Union[Mint_Instruction, None], str]: A tuple containing the parsed instruction and an error message (if any).
 
-    amt = parse_amt(params, token.dec, "amt", token.lim)
-    if amt is None:
-        error = "invalid amt"
+    """
+    (values, error) = params_schema(
+        event.content.get("params", {}), token=token, base_params=base_params
+    )
+    if values is None:
         return None, error
 
-    base_params["amt"] = amt
-
-    return base_params, ""
+    return Mint_Instruction(base_params["tick"], base_params["tid"], values["amt"]), ""
 
 
-def is_valid_event(event: Event, token: Token, params: dict) -> Tuple[bool, str]:
+def is_valid_event(
+    event: Event, token: Token, params: Mint_Instruction
+) -> Tuple[bool, str]:
     """
     Check if the event is valid.
 
     Args:
         event (Event): The event object.
         token (Token): The token object.
-        params (dict): The parsed parameters.
+        params (Mint_Instruction): The parsed instruction.
 
     Returns:
         Tuple[bool, str]: A tuple containing a boolean indicating if the event is valid and an error message (if any).
@@ -78,7 +71,7 @@ def is_valid_event(event: Event, token: Token, params: dict) -> Tuple[bool, str]
         error = "token minting is protected and minter is not deployer"
         return False, error
 
-    if token.max - token.minted < params["amt"]:
+    if token.max - token.minted < params.amt:
         error = "token minting is over max"
         return False, error
 
@@ -86,14 +79,14 @@ def is_valid_event(event: Event, token: Token, params: dict) -> Tuple[bool, str]
 
 
 def process_mint(
-    event: Event, params: dict, token: Token, balance: Balance
+    event: Event, params: Mint_Instruction, token: Token, balance: Balance
 ) -> Tuple[Token, Balance]:
     """
     Process the mint event.
 
     Args:
         event (Event): The event object.
-        params (dict): The parsed parameters.
+        params (Mint_Instruction): The parsed instruction.
         token (Token): The token object.
         balance (Balance): The balance object.
 
@@ -107,21 +100,21 @@ def process_mint(
         token.first_time = event.timestamp
         token.first_id = event.inscription_id
 
-    if token.max - token.minted == params["amt"]:
+    if token.max - token.minted == params.amt:
         token.last_number = event.inscription_number
         token.last_time = event.timestamp
         token.last_id = event.inscription_id
 
-    token.minted = amt_add(token.minted, params["amt"], token.dec)
-    token.circulating = amt_add(token.circulating, params["amt"], token.dec)
+    token.minted = amt_add(token.minted, params.amt, token.dec)
+    token.circulating = amt_add(token.circulating, params.amt, token.dec)
 
     # update address
     if balance.balance == 0:
         token.holders += 1
 
-    balance.balance = amt_add(balance.balance, params["amt"], token.dec)
+    balance.balance = amt_add(balance.balance, params.amt, token.dec)
     balance.available_balance = amt_add(
-        balance.available_balance, params["amt"], token.dec
+        balance.available_balance, params.amt, token.dec
     )
 
     return token, balance
@@ -4,9 +4,14 @@ from typing import Union, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token, Balance
-from src.indexer.utils.field import parse_amt
-from src.indexer.utils.commom import parse_tick_and_tid, amt_add, amt_sub
+from src.structure import Event, Token, Balance, Transfer_Instruction
+from src.indexer.utils.commom import amt_add, amt_sub
+from src.indexer.utils.schema import compile_schema, tick, tid, tick_matched, amt
+
+
+base_schema = compile_schema(("tick", "tid", "amt"), (tick(), tid()))
+
+params_schema = compile_schema(None, (tick_matched(), amt()))
 
 
 def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
@@ -20,20 +25,12 @@ def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
         Tuple[Union[dict, None], str]: A tuple containing the parsed base parameters and an error message if any.
 
     """
-
-    params = event.content.get("params", {})
-
-    for key in params.keys():
-        if key not in ["tick", "tid", "amt"]:
-            error = "unknown key in params"
-            return None, error
-
-    return parse_tick_and_tid(event)
+    return base_schema(event.content.get("params", {}))
 
 
 def parse_params(
     event: Event, token: Token, base_params: dict
-) -> Tuple[Union[dict, None], str]:
+) -> Tuple[Union[Transfer_Instruction, None], str]:
     """
     Parse the parameters from the event.
 
@@ -43,40 +40,35 @@ def parse_params(
         base_params (dict): The base parameters.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message if any.
+        Tuple[Union[Transfer_Instruction, None], str]: A tuple containing the parsed instruction and an error message if any.
 
     """
-
-    if base_params["tick"] != token.tick:
-        error = "tick is not matched"
-        return None, error
-
-    params = event.content.get("params", {})
-
-    amt = parse_amt(params, token.dec, "amt", token.max)
-    if amt is None:
-        error = "invalid amt"
+    (values, error) = params_schema(
+        event.content.get("params", {}), token=token, base_params=base_params
+    )
+    if values is None:
         return None, error
 
-    base_params["amt"] = amt
-
-    return base_params, ""
+    return (
+        Transfer_Instruction(base_params["tick"], base_params["tid"], values["amt"]),
+        "",
+    )
 
 
-def is_valid_event(balance: Balance, params: dict) -> Tuple[bool, str]:
+def is_valid_event(balance: Balance, params: Transfer_Instruction) -> Tuple[bool, str]:
     """
     Check if the event is valid.
 
     Args:
         balance (Balance): The balance object.
-        params (dict): The parameters.
+        params (Transfer_Instruction): The parsed instruction.
 
     Returns:
         Tuple[bool, str]: A tuple containing a boolean indicating if the event is valid and an error message if any.
 
     """
 
-    if balance.available_balance < params["amt"]:
+    if balance.available_balance < params.amt:
         error = "inscribe transfer amount is greater than available balance"
         return False, error
 
@@ -84,7 +76,7 @@ def is_valid_event(balance: Balance, params: dict) -> Tuple[bool, str]:
 
 
 def process_inscribe(
-    params: dict,
+    params: Transfer_Instruction,
     token: Token,
     balance: Balance,
 ) -> Balance:
@@ -92,7 +84,7 @@ def process_inscribe(
     Process the inscribe transfer.
 
     Args:
-        params (dict): The parameters.
+        params (Transfer_Instruction): The parsed instruction.
         token (Token): The token object.
         balance (Balance): The balance object.
 
@@ -102,10 +94,10 @@ def process_inscribe(
     """
 
     balance.available_balance = amt_sub(
-        balance.available_balance, params["amt"], token.dec
+        balance.available_balance, params.amt, token.dec
     )
     balance.transferable_balance = amt_add(
-        balance.transferable_balance, params["amt"], token.dec
+        balance.transferable_balance, params.amt, token.dec
     )
 
     return balance
@@ -113,7 +105,7 @@ def process_inscribe(
 
 def process_transfer(
     token: Token,
-    params: dict,
+    params: Transfer_Instruction,
     sender_balance: Balance,
     receiver_balance: Balance,
 ) -> Tuple[Balance, Balance, bool]:
@@ -122,7 +114,7 @@ def process_transfer(
 
     Args:
         token (Token): The token object.
-        params (dict): The parameters.
+        params (Transfer_Instruction): The parsed instruction.
         sender_balance (Balance): The sender's balance object.
         receiver_balance (Balance): The receiver's balance object.
 
@@ -133,10 +125,10 @@ def process_transfer(
 
     if sender_balance.address == receiver_balance.address:
         sender_balance.available_balance = amt_add(
-            sender_balance.available_balance, params["amt"], token.dec
+            sender_balance.available_balance, params.amt, token.dec
         )
         sender_balance.transferable_balance = amt_sub(
-            sender_balance.transferable_balance, params["amt"], token.dec
+            sender_balance.transferable_balance, params.amt, token.dec
         )
         receiver_balance = sender_balance
         return sender_balance, receiver_balance, True
@@ -144,9 +136,9 @@ def process_transfer(
     # update sender
 
     sender_balance.transferable_balance = amt_sub(
-        sender_balance.transferable_balance, params["amt"], token.dec
+        sender_balance.transferable_balance, params.amt, token.dec
     )
-    sender_balance.balance = amt_sub(sender_balance.balance, params["amt"], token.dec)
+    sender_balance.balance = amt_sub(sender_balance.balance, params.amt, token.dec)
     if sender_balance.balance == 0:
         token.holders -= 1
 
@@ -154,10 +146,8 @@ def process_transfer(
     if receiver_balance.balance == 0:
         token.holders += 1
     receiver_balance.available_balance = amt_add(
-        receiver_balance.available_balance, params["amt"], token.dec
-    )
-    receiver_balance.balance = amt_add(
-        receiver_balance.balance, params["amt"], token.dec
+        receiver_balance.available_balance, params.amt, token.dec
     )
+    receiver_balance.balance = amt_add(receiver_balance.balance, params.amt, token.dec)
 
     return sender_balance, receiver_balance, False
@@ -4,9 +4,64 @@ from typing import Union, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token
+from src.structure import Event, Token, Upgrade_Instruction
 from src.indexer.utils.field import parse_max, parse_lim, parse_ug, parse_mp
-from src.indexer.utils.commom import parse_tick_and_tid
+from src.indexer.utils.schema import (
+    Field,
+    Check,
+    compile_schema,
+    tick,
+    tid,
+    tick_matched,
+)
+
+
+base_schema = compile_schema(
+    ("tick", "tid", "max", "lim", "ug", "mp"),
+    (
+        Check(
+            lambda params, scope: (
+                "max" in params or "lim" in params or "ug" in params or "mp" in params
+            ),
+            "max & lim & ug & mp cannot be none in upgrade operation at the same time",
+        ),
+        tick(),
+        tid(),
+    ),
+)
+
+# an invalid max, lim, ug or mp is left unchanged, like a missing one
+params_schema = compile_schema(
+    None,
+    (
+        tick_matched(),
+        Field(
+            "max",
+            lambda params, scope: parse_max(params, scope["token"].dec),
+            "invalid max",
+            True,
+        ),
+        Field(
+            "lim",
+            lambda params, scope: parse_lim(
+                params,
+                scope["token"].dec,
+                scope["max"] if scope["max"] is not None else scope["token"].max,
+                False,
+            ),
+            "invalid lim",
+            True,
+        ),
+        Field("ug", lambda params, scope: parse_ug(params, False), "invalid ug", True),
+        Field("mp", lambda params, scope: parse_mp(params, False), "invalid mp", True),
+        Check(
+            lambda params, scope: (
+                scope["max"] is None or scope["max"] > scope["token"].max
+            ),
+            "max is not enabled to increase",
+        ),
+    ),
+)
 
 
 def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
@@ -23,32 +78,14 @@ def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
         None
 
     """
-    params = event.content.get("params", {})
-
-    for key in params.keys():
-        if key not in ["tick", "tid", "max", "lim", "ug", "mp"]:
-            error = "unknown key in params"
-            return None, error
-
-    if (
-        "max" not in params
-        and "lim" not in params
-        and "ug" not in params
-        and "mp" not in params
-    ):
-        error = (
-            "max & lim & ug & mp cannot be none in upgrade operation at the same time"
-        )
-        return None, error
-
-    return parse_tick_and_tid(event)
+    return base_schema(event.content.get("params", {}))
 
 
 def parse_params(
     event: Event, token: Token, base_params: dict
-) -> Tuple[Union[dict, None], str]:
+) -> Tuple[Union[Upgrade_Instruction, None], str]:
     """
-    Parse the parameters from the event content and update the base parameters.
+    Parse the parameters from the event content on top of the base parameters.
 
     Args:
         event (Event): The event containing the parameters.
@@ -56,29 +93,29 @@ def parse_params(
         base_params (dict): The base parameters.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message if any.
+        Tuple[Union[Upgrade_Instruction, None], str]: A tuple containing the parsed instruction and an error message if any.
 
     Raises:
         None
 
     """
-    if base_params["tick"] != token.tick:
-        error = "tick is not matched"
-        return None, error
-
-    params = event.content.get("params", {})
-
-    base_params["max"] = parse_max(params, token.dec)
-    max = base_params["max"] if base_params["max"] is not None else token.max
-    base_params["lim"] = parse_lim(params, token.dec, max, False)
-    base_params["ug"] = parse_ug(params, False)
-    base_params["mp"] = parse_mp(params, False)
-
-    if base_params["max"] is not None and base_params["max"] <= token.max:
-        error = "max is not enabled to increase"
+    (values, error) = params_schema(
+        event.content.get("params", {}), token=token, base_params=base_params
+    )
+    if values is None:
         return None, error
 
-    return base_params, ""
+    return (
+        Upgrade_Instruction(
+            base_params["tick"],
+            base_params["tid"],
+            values["max"],
+            values["lim"],
+            values["ug"],
+            values["mp"],
+        ),
+        "",
+    )
 
 
 def is_valid_event(event: Event, token: Token) -> Tuple[bool, str]:
@@ -107,13 +144,13 @@ def is_valid_event(event: Event, token: Token) -> Tuple[bool, str]:
     return True, ""
 
 
-def process_upgrade(event: Event, params: dict, token: Token) -> Token:
+def process_upgrade(event: Event, params: Upgrade_Instruction, token: Token) -> Token:
     """
     Process the token upgrade based on the parameters.
 
     Args:
         event (Event): The event triggering the upgrade.
-        params (dict): The parameters for the upgrade.
+        params (Upgrade_Instruction): The parsed instruction of the upgrade.
         token (Token): The token object.
 
     Returns:
@@ -123,17 +160,17 @@ def process_upgrade(event: Event, params: dict, token: Token) -> Token:
         None
 
     """
-    if params["max"] is not None:
-        token.max = params["max"]
+    if params.max is not None:
+        token.max = params.max
 
-    if params["lim"] is not None:
-        token.lim = params["lim"]
+    if params.lim is not None:
+        token.lim = params.lim
 
-    if params["mp"] is not None:
-        token.mp = params["mp"]
+    if params.mp is not None:
+        token.mp = params.mp
 
-    if params["ug"] is not None:
-        token.ug = params["ug"]
+    if params.ug is not None:
+        token.ug = params.ug
 
     token.last_upgrade_time = event.timestamp
     token.upgrade_records.append(event.inscription_id)
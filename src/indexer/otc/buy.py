@@ -5,10 +5,16 @@ from decimal import Decimal
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token, Balance, OTC, OTC_Record
-from src.indexer.utils.field import parse_amt
+from src.structure import (
+    Event,
+    Token,
+    Balance,
+    OTC,
+    OTC_Record,
+    OTC_Buy_Instruction,
+)
+from src.indexer.utils.schema import compile_schema, tick, tid, tick_matched, amt
 from src.indexer.utils.commom import (
-    parse_tick_and_tid_and_function_id,
     amt_mul,
     amt_div,
     amt_sub,
@@ -16,6 +22,13 @@ from src.indexer.utils.commom import (
 )
 
 
+base_schema = compile_schema(("oid", "tick", "tid", "amt"), (tick(), tid(), tid("oid")))
+
+params_schema = compile_schema(
+    None, (tick_matched(token="token2"), amt(token="token2"))
+)
+
+
 def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
     """
     Parse the base parameters from the event.
@@ -27,24 +40,12 @@ def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
         Tuple[Union[dict, None], str]: A tuple containing the parsed base parameters and an error message if any.
 
     """
-    params = event.content.get("params", {})
-
-    for key in params.keys():
-        if key not in [
-            "oid",
-            "tick",
-            "tid",
-            "amt",
-        ]:
-            error = "unknown key in params"
-            return None, error
-
-    return parse_tick_and_tid_and_function_id(event, "oid")
+    return base_schema(event.content.get("params", {}))
 
 
 def parse_params(
     event: Event, token2: Token, base_params: dict
-) -> Tuple[Union[dict, None], str]:
+) -> Tuple[Union[OTC_Buy_Instruction, None], str]:
     """
     Parse the additional parameters from the event.
 
@@ -54,34 +55,36 @@ def parse_params(
         base_params (dict): The base parameters.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message if any.
+        Tuple[Union[OTC_Buy_Instruction, None], str]: A tuple containing the parsed instruction and an error message if any.
 
     """
-    if base_params["tick"] != token2.tick:
-        error = "tick is not matched"
-        return None, error
-
-    params = event.content.get("params", {})
-
-    amt = parse_amt(params, token2.dec, "amt", token2.max)
-    if amt is None:
-        error = "invalid amt"
+    (values, error) = params_schema(
+        event.content.get("params", {}), token2=token2, base_params=base_params
+    )
+    if values is None:
         return None, error
 
-    base_params["amt"] = amt
-
-    return base_params, ""
+    return (
+        OTC_Buy_Instruction(
+            base_params["tick"], base_params["tid"], base_params["oid"], values["amt"]
+        ),
+        "",
+    )
 
 
 def is_valid_event(
-    event: Event, params: dict, token2: Token, token2_balance: Balance, otc: OTC
+    event: Event,
+    params: OTC_Buy_Instruction,
+    token2: Token,
+    token2_balance: Balance,
+    otc: OTC,
 ) -> Tuple[bool, str]:
     """
     Check if the event is valid for buying.
 
     Args:
         event (Event): The event object.
-        params (dict): The parsed parameters.
+        params (OTC_Buy_Instruction): The parsed instruction.
         token2 (Token): The second token object.
         token2_balance (Balance): The balance of the second token.
         otc (OTC): The OTC object.
@@ -103,16 +106,16 @@ def is_valid_event(
         error = "otc is sold out"
         return False, error
 
-    if params["amt"] < otc.mba:
+    if params.amt < otc.mba:
         error = "buy amount is less than minimum buy amount"
         return False, error
 
     available_amt = amt_sub(max_otc_receive, otc.received, token2.dec)
-    if available_amt < params["amt"]:
+    if available_amt < params.amt:
         error = "buy amount is greater than available otc"
         return False, error
 
-    if token2_balance.available_balance < params["amt"]:
+    if token2_balance.available_balance < params.amt:
         error = "buy amount is greater than available balance"
         return False, error
 
@@ -121,7 +124,7 @@ def is_valid_event(
 
 def process_buy(
     event: Event,
-    params: dict,
+    params: OTC_Buy_Instruction,
     token1: Token,
     token2: Token,
     token2_balance: Balance,
@@ -132,7 +135,7 @@ def process_buy(
 
     Args:
         event (Event): The event object.
-        params (dict): The parsed parameters.
+        params (OTC_Buy_Instruction): The parsed instruction.
         token1 (Token): The first token object.
         token2 (Token): The second token object.
         token2_balance (Balance): The balance of the second token.
@@ -143,16 +146,16 @@ def process_buy(
 
     """
     token2_balance.available_balance = amt_sub(
-        token2_balance.available_balance, params["amt"], token2.dec
+        token2_balance.available_balance, params.amt, token2.dec
     )
-    token2_balance.balance = amt_sub(token2_balance.balance, params["amt"], token2.dec)
+    token2_balance.balance = amt_sub(token2_balance.balance, params.amt, token2.dec)
 
     if token2_balance.balance == 0:
         token2.holders -= 1
 
-    otc.received = amt_add(otc.received, params["amt"], token2.dec)
-    user_received = amt_div(params["amt"], otc.er, token1.dec)
-    otc_record = create_otc_record(event, otc, params["amt"], user_received)
+    otc.received = amt_add(otc.received, params.amt, token2.dec)
+    user_received = amt_div(params.amt, otc.er, token1.dec)
+    otc_record = create_otc_record(event, otc, params.amt, user_received)
 
     return token2, token2_balance, otc, otc_record
 
@@ -4,9 +4,57 @@ from typing import Union, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token, Balance, OTC
-from src.indexer.utils.field import parse_amt, parse_er, parse_dl, parse_mba
-from src.indexer.utils.commom import parse_double_tick_and_tid, amt_mul, amt_sub
+from src.structure import Event, Token, Balance, OTC, OTC_Create_Instruction
+from src.indexer.utils.field import parse_er, parse_dl, parse_mba
+from src.indexer.utils.commom import amt_mul, amt_sub
+from src.indexer.utils.schema import (
+    Field,
+    Check,
+    compile_schema,
+    tick,
+    tid,
+    tick_matched,
+    amt,
+)
+
+
+base_schema = compile_schema(
+    ("tick1", "tid1", "tick2", "tid2", "supply", "er", "dl", "mba", "oid"),
+    (tick("tick1"), tid("tid1"), tick("tick2"), tid("tid2")),
+)
+
+params_schema = compile_schema(
+    None,
+    (
+        tick_matched("tick1", "token1"),
+        tick_matched("tick2", "token2"),
+        amt("supply", "token1"),
+        Field(
+            "er",
+            lambda params, scope: parse_er(params, scope["token2"].dec),
+            "invalid er",
+        ),
+        Field(
+            "dl",
+            lambda params, scope: parse_dl(params, scope["event"].timestamp),
+            "invalid dl",
+        ),
+        Field(
+            "mba",
+            lambda params, scope: parse_mba(
+                params, scope["token2"].dec, scope["token2"].max
+            ),
+            "invalid mba",
+        ),
+        Check(
+            lambda params, scope: (
+                amt_mul(scope["supply"], scope["er"], scope["token2"].dec)
+                >= scope["mba"]
+            ),
+            "invalid config: supply * er < mba",
+        ),
+    ),
+)
 
 
 def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
@@ -20,29 +68,12 @@ def parse_base_params(event: Event) -> Tuple[Union[dict, None], str]:
         Tuple[Union[dict, None], str]: A tuple containing the parsed base parameters and an error message if any.
 
     """
-    params = event.content.get("params", {})
-
-    for key in params.keys():
-        if key not in [
-            "tick1",
-            "tid1",
-            "tick2",
-            "tid2",
-            "supply",
-            "er",
-            "dl",
-            "mba",
-            "oid",
-        ]:
-            error = "unknown key in params"
-            return None, error
-
-    return parse_double_tick_and_tid(event)
+    return base_schema(event.content.get("params", {}))
 
 
 def parse_params(
     event: Event, token1: Token, token2: Token, base_params: dict
-) -> Tuple[Union[dict, None], str]:
+) -> Tuple[Union[OTC_Create_Instruction, None], str]:
     """
     Parse the additional parameters from the event.
 
@@ -53,66 +84,49 @@ def parse_params(
         base_params (dict): The base parameters.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message if any.
+        Tuple[Union[OTC_Create_Instruction, None], str]: A tuple containing the parsed instruction and an error message if any.
 
     """
-    if base_params["tick1"] != token1.tick:
-        error = "tick1 is not matched"
-        return None, error
-
-    if base_params["tick2"] != token2.tick:
-        error = "tick2 is not matched"
-        return None, error
-
-    params = event.content.get("params", {})
-
-    supply = parse_amt(params, token1.dec, "supply", token1.max)
-    if supply is None:
-        error = "invalid supply"
-        return None, error
-    base_params["supply"] = supply
-
-    er = parse_er(params, token2.dec)
-    if er is None:
-        error = "invalid er"
-        return None, error
-    base_params["er"] = er
-
-    dl = parse_dl(params, event.timestamp)
-    if dl is None:
-        error = "invalid dl"
-        return None, error
-    base_params["dl"] = dl
-
-    mba = parse_mba(params, token2.dec, token2.max)
-    if mba is None:
-        error = "invalid mba"
-        return None, error
-    base_params["mba"] = mba
-
-    if (
-        amt_mul(base_params["supply"], base_params["er"], token2.dec)
-        < base_params["mba"]
-    ):
-        error = "invalid config: supply * er < mba"
+    (values, error) = params_schema(
+        event.content.get("params", {}),
+        event=event,
+        token1=token1,
+        token2=token2,
+        base_params=base_params,
+    )
+    if values is None:
         return None, error
 
-    return base_params, ""
+    return (
+        OTC_Create_Instruction(
+            base_params["tick1"],
+            base_params["tid1"],
+            base_params["tick2"],
+            base_params["tid2"],
+            values["supply"],
+            values["er"],
+            values["dl"],
+            values["mba"],
+        ),
+        "",
+    )
 
 
-def is_valid_event(params: dict, token1_balance: Balance) -> Tuple[bool, str]:
+def is_valid_event(
+    params: OTC_Create_Instruction, token1_balance: Balance
+) -> Tuple[bool, str]:
     """
     Check if the event is valid.
 
     Args:
-        params (dict): The parameters.
+        params (OTC_Create_Instruction): The parsed instruction.
         token1_balance (Balance): The balance of token1.
 
     Returns:
         Tuple[bool, str]: A tuple containing a boolean indicating if the event is valid and an error message if any.
 
     """
-    if token1_balance.available_balance < params["supply"]:
+    if token1_balance.available_balance < params.supply:
         error = "insufficient available balance to create otc"
         return False, error
 
@@ -121,7 +135,7 @@ def is_valid_event(params: dict, token1_balance: Balance) -> Tuple[bool, str]:
 
 def process_create(
     event: Event,
-    params: dict,
+    params: OTC_Create_Instruction,
     token1: Token,
     token1_balance: Balance,
 ) -> Tuple[Token, Balance, OTC]:
@@ -130,7 +144,7 @@ def process_create(
 
     Args:
         event (Event): The event object.
-        params (dict): The parameters.
+        params (OTC_Create_Instruction): The parsed instruction.
         token1 (Token): The first token object.
         token1_balance (Balance): The balance of token1.
 
@@ -139,25 +153,23 @@ def process_create(
 
     """
     token1_balance.available_balance = amt_sub(
-        token1_balance.available_balance, params["supply"], token1.dec
-    )
-    token1_balance.balance = amt_sub(
-        token1_balance.balance, params["supply"], token1.dec
+        token1_balance.available_balance, params.supply, token1.dec
     )
+    token1_balance.balance = amt_sub(token1_balance.balance, params.supply, token1.dec)
 
     if token1_balance.balance == 0:
         token1.holders -= 1
 
     otc = OTC(
         event.inscription_number,
-        params["tick1"],
-        params["tid1"],
-        params["supply"],
-        params["tick2"],
-        params["tid2"],
-        params["er"],
-        params["mba"],
-        params["dl"],
+        params.tick1,
+        params.tid1,
+        params.supply,
+        params.tick2,
+        params.tid2,
+        params.er,
+        params.mba,
+        params.dl,
         event.sender,
         event.timestamp,
         event.inscription_id,
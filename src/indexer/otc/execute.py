@@ -5,12 +5,22 @@ from typing import Union, Tuple
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
 
-from src.structure import Event, Token, Balance, OTC, OTC_Record
-from src.indexer.utils.field import parse_tid
+from src.structure import (
+    Event,
+    Token,
+    Balance,
+    OTC,
+    OTC_Record,
+    OTC_Execute_Instruction,
+)
+from src.indexer.utils.schema import compile_schema, tid
 from src.indexer.utils.commom import amt_mul, amt_sub, amt_add, amt_zero
 
 
-def parse_params(event: Event) -> Tuple[Union[dict, None], str]:
+params_schema = compile_schema(None, (tid("oid"),))
+
+
+def parse_params(event: Event) -> Tuple[Union[OTC_Execute_Instruction, None], str]:
     """
     Parse the parameters from the event content.
 
@@ -18,17 +28,13 @@ def parse_params(event: Event) -> Tuple[Union[dict, None], str]:
         event (Event): The event object.
 
     Returns:
-        Tuple[Union[dict, None], str]: A tuple containing the parsed parameters and an error message (if any).
+        Tuple[Union[OTC_Execute_Instruction, None], str]: A tuple containing the parsed instruction and an error message (if any).
     """
-    params = event.content.get("params", {})
-
-    oid = parse_tid(params, "oid")
-    if oid is None:
-        error = "invalid oid"
+    (values, error) = params_schema(event.content.get("params", {}))
+    if values is None:
         return None, error
 
-    params["oid"] = oid
-    return params, ""
+    return OTC_Execute_Instruction(values["oid"]), ""
 
 
 def is_valid_event(event: Event, otc: OTC, token2: Token) -> Tuple[bool, str]:
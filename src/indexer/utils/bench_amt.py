@@ -0,0 +1,81 @@
+import os
+import sys
+import timeit
+import argparse
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src.indexer.utils.commom import amt_mul, amt_div, amt_add, amt_sub
+from src.indexer.utils.check_amt import (
+    reference_mul,
+    reference_div,
+    reference_add,
+    reference_sub,
+)
+
+
+dec = 18
+scale = 10**dec
+amt = Decimal("1234.5")
+balance = Decimal("987654321.123456789012345678")
+rate = Decimal("0.000123456789")
+
+
+def transfer(add, sub):
+    # the updates of a transfer: both balances of the sender, then of the receiver
+    sub(balance, amt, dec)
+    sub(balance, amt, dec)
+    add(balance, amt, dec)
+    add(balance, amt, dec)
+
+
+def otc(mul, div, sub):
+    # the updates of an otc-buy: price, share of the supply, remaining supply
+    mul(amt, rate, dec)
+    div(amt, rate, dec)
+    sub(balance, amt, dec)
+
+
+def scaled_transfer():
+    # the same updates on amounts kept as ints scaled by 10**dec, converted from and
+    # back to Decimal at the storage boundary as the tokens and balances are
+    scaled_balance = int(balance.scaleb(dec))
+    scaled_amt = int(amt.scaleb(dec))
+    Decimal(scaled_balance - scaled_amt).scaleb(-dec)
+    Decimal(scaled_balance - scaled_amt).scaleb(-dec)
+    Decimal(scaled_balance + scaled_amt).scaleb(-dec)
+    Decimal(scaled_balance + scaled_amt).scaleb(-dec)
+
+
+def scaled_otc():
+    scaled_amt = int(amt.scaleb(dec))
+    scaled_rate = int(rate.scaleb(dec))
+    scaled_balance = int(balance.scaleb(dec))
+    Decimal(scaled_amt * scaled_rate // scale).scaleb(-dec)
+    Decimal(scaled_amt * scale // scaled_rate).scaleb(-dec)
+    Decimal(scaled_balance - scaled_amt).scaleb(-dec)
+
+
+benchmarks = (
+    ("transfer, reference", lambda: transfer(reference_add, reference_sub)),
+    ("transfer, current", lambda: transfer(amt_add, amt_sub)),
+    ("transfer, scaled int", scaled_transfer),
+    ("otc, reference", lambda: otc(reference_mul, reference_div, reference_sub)),
+    ("otc, current", lambda: otc(amt_mul, amt_div, amt_sub)),
+    ("otc, scaled int", scaled_otc),
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("python bench_amt.py")
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    # the benchmarks take turns, so a slow stretch of the machine hits them all alike
+    best = {name: float("inf") for name, _ in benchmarks}
+    for _ in range(args.repeat):
+        for name, benchmark in benchmarks:
+            best[name] = min(best[name], timeit.timeit(benchmark, number=args.number))
+    for name, seconds in best.items():
+        print(f"{name:<24} {seconds / args.number * 1e9:8.0f} ns")
@@ -0,0 +1,102 @@
+import os
+import sys
+import random
+import argparse
+from decimal import Decimal, getcontext, ROUND_DOWN
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src.indexer.utils.commom import amt_mul, amt_div, amt_add, amt_sub
+from src.indexer.utils.field import max_amt
+
+
+# the amount helpers as they were before the quantizers were cached, on the thread
+# context they used to set
+getcontext().prec = 38
+
+
+def reference_mul(amt1: Decimal, amt2: Decimal, dec: int) -> Decimal:
+    return (amt1 * amt2).quantize(Decimal("0." + "0" * dec), rounding=ROUND_DOWN)
+
+
+def reference_div(amt1: Decimal, amt2: Decimal, dec: int) -> Decimal:
+    return (amt1 / amt2).quantize(Decimal("0." + "0" * dec), rounding=ROUND_DOWN)
+
+
+def reference_add(amt1: Decimal, amt2: Decimal, dec: int) -> Decimal:
+    return (amt1 + amt2).quantize(Decimal("0." + "0" * dec), rounding=ROUND_DOWN)
+
+
+def reference_sub(amt1: Decimal, amt2: Decimal, dec: int) -> Decimal:
+    return (amt1 - amt2).quantize(Decimal("0." + "0" * dec), rounding=ROUND_DOWN)
+
+
+operations = (
+    ("amt_mul", amt_mul, reference_mul),
+    ("amt_div", amt_div, reference_div),
+    ("amt_add", amt_add, reference_add),
+    ("amt_sub", amt_sub, reference_sub),
+)
+
+
+def random_amt(rng: random.Random) -> Decimal:
+    """
+    An amount as parse_amt returns them, favouring the bounds and the small ones.
+    """
+    kind = rng.random()
+    if kind < 0.05:
+        return Decimal(0)
+    if kind < 0.1:
+        return max_amt
+    if kind < 0.15:
+        return Decimal(1)
+    dec = rng.randint(0, 18)
+    digits = rng.randint(1, 20)
+    integer = rng.randrange(10 ** rng.randint(0, digits))
+    if dec == 0:
+        return Decimal(integer)
+    fraction = str(rng.randrange(10**dec)).rjust(dec, "0")
+    return Decimal(f"{integer}.{fraction}")
+
+
+def outcome(operation, amt1: Decimal, amt2: Decimal, dec: int):
+    try:
+        return "value", str(operation(amt1, amt2, dec))
+    except ArithmeticError as e:
+        return "error", type(e).__name__
+
+
+def check(cases: int, seed: int) -> int:
+    """
+    Run random operands through the amount helpers and the reference ones.
+
+    Args:
+        cases (int): The number of operand pairs.
+        seed (int): The seed of the operands.
+
+    Returns:
+        int: The number of mismatches, each printed.
+    """
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(cases):
+        amt1 = random_amt(rng)
+        amt2 = random_amt(rng)
+        dec = rng.randint(0, 18)
+        for name, operation, reference in operations:
+            actual = outcome(operation, amt1, amt2, dec)
+            expected = outcome(reference, amt1, amt2, dec)
+            if actual != expected:
+                mismatches += 1
+                print(f"{name}({amt1}, {amt2}, {dec}): {actual} != {expected}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("python check_amt.py")
+    parser.add_argument("--cases", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    mismatches = check(args.cases, args.seed)
+    print(f"{args.cases} cases, {mismatches} mismatches")
+    sys.exit(1 if mismatches else 0)
@@ -1,5 +1,5 @@
 from typing import Union
-from decimal import Decimal, getcontext
+from decimal import Decimal
 
 
 def parse_tick(data: dict, key: str = "tick") -> Union[str, None]:
@@ -282,7 +282,11 @@ def parse_er(data: dict, dec: int) -> Union[Decimal, None]:
 
 max_uint64 = 2**64 - 1
 max_amt = Decimal(f"{max_uint64}.999999999999999999")
-max_precision = 38
+
+# the same few amounts are inscribed over and over, so their parses are kept, the
+# Decimal results being immutable; cleared whole once full
+amt_cache = {}
+amt_cache_size = 1 << 16
 
 
 def parse_amt(
@@ -312,11 +316,21 @@ def parse_amt(
     if not isinstance(amt, str):
         return None
 
+    cache_key = (amt, dec, lim, be_zero)
+    if cache_key in amt_cache:
+        return amt_cache[cache_key]
+    if len(amt_cache) >= amt_cache_size:
+        amt_cache.clear()
+    amt_cache[cache_key] = parsed = parse_amt_str(amt, dec, lim, be_zero)
+    return parsed
+
+
+def parse_amt_str(
+    amt: str, dec: int, lim: Decimal, be_zero: bool
+) -> Union[Decimal, None]:
     if "+" in amt or "-" in amt:
         return None
 
-    getcontext().prec = max_precision
-
     if "." in amt:
         if amt[0] == "." or amt[-1] == ".":
             return None
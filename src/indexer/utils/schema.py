@@ -0,0 +1,118 @@
+import os
+import sys
+from typing import Any, Callable, Iterable, NamedTuple, Tuple, Union
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../..")))
+
+from src.indexer.utils.field import parse_tick, parse_tid, parse_amt
+
+
+# every parse and test is called with the params and the scope of the validator: the
+# context it was called with by keyword, then the values parsed so far by name
+Rule = Callable[[dict, dict], Any]
+
+
+class Field(NamedTuple):
+    """
+    A parameter of an instruction.
+
+    Attributes:
+        name (str): The name the parsed value is stored under in the scope.
+        parse (Rule): Returns the parsed value or None if it is invalid. Called with the
+            params and `key` instead when `key` is set.
+        error (str): The error returned when the value is invalid.
+        optional (bool): Whether None is a valid value, left as None in the result.
+        key (str, optional): The key of the params `parse` reads.
+    """
+
+    name: str
+    parse: Rule
+    error: str
+    optional: bool = False
+    key: Union[str, None] = None
+
+
+class Check(NamedTuple):
+    """
+    A condition on the parameters of an instruction.
+
+    Attributes:
+        test (Rule): Returns whether the condition holds.
+        error (str): The error returned when the condition does not hold.
+    """
+
+    test: Rule
+    error: str
+
+
+def tick(key: str = "tick") -> Field:
+    return Field(key, parse_tick, f"invalid {key}", key=key)
+
+
+def tid(key: str = "tid") -> Field:
+    return Field(key, parse_tid, f"invalid {key}", key=key)
+
+
+def tick_matched(key: str = "tick", token: str = "token") -> Check:
+    """
+    Check the tick of the base params against the tick of the token in the scope.
+    """
+    return Check(
+        lambda params, scope: scope["base_params"][key] == scope[token].tick,
+        f"{key} is not matched",
+    )
+
+
+def amt(key: str = "amt", token: str = "token", bound: str = "max") -> Field:
+    """
+    Parse an amount of the token in the scope, bounded by its `bound` attribute.
+    """
+    return Field(
+        key,
+        lambda params, scope: parse_amt(
+            params, scope[token].dec, key, getattr(scope[token], bound)
+        ),
+        f"invalid {key}",
+    )
+
+
+def compile_schema(
+    keys: Union[Iterable[str], None], steps: Iterable[Union[Field, Check]]
+) -> Callable[..., Tuple[Union[dict, None], str]]:
+    """
+    Compile the schema of an instruction into its validator.
+
+    Args:
+        keys (Union[Iterable[str], None]): The keys allowed in the params, None to allow any.
+        steps (Iterable[Union[Field, Check]]): The fields and checks, in the order the
+            errors are reported.
+
+    Returns:
+        Callable[..., Tuple[Union[dict, None], str]]: The validator, called with the
+            params and the context of the rules by keyword. It returns the scope, the
+            context along with the parsed values by name, and an error message if any.
+    """
+    allowed = frozenset(keys) if keys is not None else None
+    # the steps are flattened once into plain tuples, each run reads no attributes
+    plan = tuple(
+        (None, step.test, None, False, step.error)
+        if isinstance(step, Check)
+        else (step.name, step.parse, step.key, step.optional, step.error)
+        for step in steps
+    )
+
+    def validate(params: dict, **scope) -> Tuple[Union[dict, None], str]:
+        if allowed is not None and not allowed.issuperset(params):
+            return None, "unknown key in params"
+        for name, rule, key, optional, error in plan:
+            if name is None:
+                if not rule(params, scope):
+                    return None, error
+                continue
+            value = rule(params, key) if key is not None else rule(params, scope)
+            if value is None and not optional:
+                return None, error
+            scope[name] = value
+        return scope, ""
+
+    return validate
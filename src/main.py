@@ -1,6 +1,5 @@
 import os
 import sys
-import copy
 from loguru import logger
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -58,9 +57,7 @@ async def handle_event(
     event.operation = op
 
     if is_pending is False:
-        copied_content = copy.deepcopy(content)
         event = await registered_handlers[op](event, data_processer)
-        event.content = copied_content
 
     await data_processer.save_event(event)
     logger.info(
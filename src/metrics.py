@@ -0,0 +1,138 @@
+import time
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from loguru import logger
+
+
+counters = defaultdict(int)
+gauges = defaultdict(int)
+# name -> [count, total seconds, max seconds]
+timings = defaultdict(lambda: [0, 0.0, 0.0])
+
+
+def incr(name: str, value: int = 1):
+    """
+    Add to a counter.
+
+    Args:
+        name (str): The name of the counter.
+        value (int, optional): The amount to add. Defaults to 1.
+    """
+    counters[name] += value
+
+
+def gauge(name: str, value: int):
+    """
+    Add to a gauge, a negative value lowers it.
+
+    Args:
+        name (str): The name of the gauge.
+        value (int): The amount to add.
+    """
+    gauges[name] += value
+
+
+def observe(name: str, seconds: float):
+    """
+    Record a duration.
+
+    Args:
+        name (str): The name of the timing.
+        seconds (float): The duration in seconds.
+    """
+    timing = timings[name]
+    timing[0] += 1
+    timing[1] += seconds
+    timing[2] = max(timing[2], seconds)
+
+
+def snapshot() -> dict:
+    """
+    Get the current value of every metric.
+
+    Returns:
+        dict: Counters and gauges by name, and the count, mean and max of every timing.
+    """
+    values = dict(counters)
+    values.update(gauges)
+    for name, (count, total, maximum) in timings.items():
+        values[f"{name}.count"] = count
+        values[f"{name}.mean"] = total / count if count else 0.0
+        values[f"{name}.max"] = maximum
+    return values
+
+
+async def report(interval: float):
+    """
+    Log every metric periodically.
+
+    Args:
+        interval (float): The number of seconds between two reports.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        values = snapshot()
+        if values:
+            logger.info(
+                "metrics: "
+                + ", ".join(
+                    f"{name}={value:.4f}"
+                    if isinstance(value, float)
+                    else f"{name}={value}"
+                    for name, value in sorted(values.items())
+                )
+            )
+
+
+async def acquire_connection(pool: str, acquire, timeout: float = None):
+    """
+    Take a connection out of a pool, recording the wait and counting the failures.
+
+    Args:
+        pool (str): The name of the pool, used as the prefix of the metrics.
+        acquire: The function returning the awaitable that acquires a connection.
+        timeout (float, optional): The number of seconds to wait for a connection.
+
+    Returns:
+        The connection, to be given back through `release_connection`.
+    """
+    start = time.monotonic()
+    try:
+        conn = await asyncio.wait_for(_await(acquire()), timeout)
+    except Exception:
+        incr(f"{pool}.acquire_failures")
+        raise
+    observe(f"{pool}.acquire_wait", time.monotonic() - start)
+    gauge(f"{pool}.in_use", 1)
+    return conn
+
+
+async def release_connection(pool: str, release, conn):
+    """
+    Give a connection taken with `acquire_connection` back to its pool.
+
+    Args:
+        pool (str): The name of the pool.
+        release: The function returning the awaitable that releases a connection.
+        conn: The connection.
+    """
+    gauge(f"{pool}.in_use", -1)
+    await release(conn)
+
+
+@asynccontextmanager
+async def pooled(pool: str, acquire, release, timeout: float = None):
+    """
+    Instrumented equivalent of `async with pool.acquire() as conn`.
+    """
+    conn = await acquire_connection(pool, acquire, timeout)
+    try:
+        yield conn
+    finally:
+        await release_connection(pool, release, conn)
+
+
+async def _await(awaitable):
+    return await awaitable
@@ -0,0 +1,208 @@
+import os
+import sys
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Union
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import register
+from src.storage import registered_handlers
+from src.structure import Event, EventType
+from src.indexer.core import deploy as deploy_indexer
+from src.indexer.core import mint as mint_indexer
+from src.indexer.core import burn as burn_indexer
+from src.indexer.core import transfer as transfer_indexer
+from src.indexer.core import upgrade as upgrade_indexer
+from src.indexer.otc import create as create_indexer
+from src.indexer.otc import buy as buy_indexer
+from src.indexer.otc import execute as execute_indexer
+from src.handler.otc.create import otc_start_block_height
+from src.data.processer.interface import Interface as DataProcesser
+
+
+# below this many events a block is not worth the round-trip to the worker processes
+min_events = 64
+
+
+def base_params_error(event: Event, parse_base_params) -> Union[Tuple[str, None], None]:
+    (base_params, error) = parse_base_params(event)
+    if base_params is None:
+        return f"Failed to parse inscription params: {error}", None
+    return None
+
+
+def check_deploy(event: Event):
+    if event.event_type != EventType.INSCRIBE:
+        return "deploy event don't care about transfer", None
+    (params, error) = deploy_indexer.parse_params(event)
+    if params is None:
+        return f"invalid inscription, {error}", event.inscription_number
+    return None
+
+
+def check_mint(event: Event):
+    if event.event_type != EventType.INSCRIBE:
+        return "mint event don't care about transfer", None
+    return base_params_error(event, mint_indexer.parse_base_params)
+
+
+def check_burn(event: Event):
+    return base_params_error(event, burn_indexer.parse_base_params)
+
+
+def check_upgrade(event: Event):
+    return base_params_error(event, upgrade_indexer.parse_base_params)
+
+
+def check_transfer(event: Event):
+    return base_params_error(event, transfer_indexer.parse_base_params)
+
+
+def check_otc_create(event: Event):
+    if event.block_height < otc_start_block_height:
+        return "otc function is not available yet", None
+    return base_params_error(event, create_indexer.parse_base_params)
+
+
+def check_otc_buy(event: Event):
+    if event.block_height < otc_start_block_height:
+        return "otc function is not available yet", None
+    return base_params_error(event, buy_indexer.parse_base_params)
+
+
+def check_otc_execute(event: Event):
+    if event.block_height < otc_start_block_height:
+        return "otc function is not available yet", None
+    if event.event_type != EventType.INSCRIBE:
+        return "otc-execute event don't care about transfer", None
+    return base_params_error(event, execute_indexer.parse_params)
+
+
+# the checks each handler runs, in its order, before it reads any state
+op_checks = {
+    "deploy": check_deploy,
+    "mint": check_mint,
+    "burn": check_burn,
+    "upgrade": check_upgrade,
+    "transfer": check_transfer,
+    "otc-create": check_otc_create,
+    "otc-buy": check_otc_buy,
+    "otc-execute": check_otc_execute,
+}
+
+
+def validate_event(event: Event) -> Union[dict, None]:
+    """
+    Run the checks of `handle_event` and of the op's handler that need no state.
+
+    Args:
+        event (Event): The event to check.
+
+    Returns:
+        Union[dict, None]: The error, operation and function id to record if the event
+            is invalid, None if it has to go through its handler.
+    """
+    try:
+        content = event.content
+
+        for key in content.keys():
+            if key not in ["p", "op", "params"]:
+                return {
+                    "error": "unknown key in instruction",
+                    "operation": None,
+                    "function_id": None,
+                }
+
+        if content.get("p", "").lower() != "orc-20":
+            return {"error": "invaild p", "operation": None, "function_id": None}
+
+        op = content.get("op", "").lower()
+        if op == "" or op not in registered_handlers.keys():
+            return {"error": "invalid op", "operation": None, "function_id": None}
+
+        params = content.get("params", {})
+        if not params:
+            return {"error": "invalid params", "operation": None, "function_id": None}
+
+        if op not in op_checks:
+            return None
+        result = op_checks[op](event)
+        if result is None:
+            return None
+        (error, function_id) = result
+        return {"error": error, "operation": op, "function_id": function_id}
+    except Exception:
+        # leave the event to its handler, which fails the same way as before
+        return None
+
+
+def validate_events(events: List[dict]) -> List[Union[dict, None]]:
+    """
+    Validate a batch of events in a worker process.
+
+    Args:
+        events (List[dict]): The events as `vars(event)`.
+
+    Returns:
+        List[Union[dict, None]]: The result of `validate_event` for each event.
+    """
+    return [validate_event(Event(**event)) for event in events]
+
+
+def create_executor(workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+async def filter_events(
+    events: List[Event],
+    data_processer: DataProcesser,
+    executor: ProcessPoolExecutor,
+    workers: int,
+) -> List[Event]:
+    """
+    Record the events of a block that are invalid on their own and keep the others.
+
+    Args:
+        events (List[Event]): The events of the block, in block order.
+        data_processer (DataProcesser): The data processer the invalid events are saved to.
+        executor (ProcessPoolExecutor): The pool of worker processes.
+        workers (int): The number of worker processes.
+
+    Returns:
+        List[Event]: The events still to be handled, in block order.
+    """
+    if len(events) < min_events:
+        return events
+
+    loop = asyncio.get_running_loop()
+    size = (len(events) + workers - 1) // workers
+    chunks = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor,
+                validate_events,
+                [vars(event) for event in events[index : index + size]],
+            )
+            for index in range(0, len(events), size)
+        )
+    )
+
+    candidates = []
+    rejected = []
+    for event, result in zip(events, [result for chunk in chunks for result in chunk]):
+        if result is None:
+            candidates.append(event)
+            continue
+        event.valid = False
+        event.error = result["error"]
+        event.handled = True
+        if result["operation"] is not None:
+            event.operation = result["operation"]
+        if result["function_id"] is not None:
+            event.function_id = result["function_id"]
+        rejected.append(event)
+
+    if rejected:
+        await data_processer.save_events(rejected)
+    return candidates
@@ -1,7 +1,6 @@
 import argparse
 import os
 import sys
-import json
 import signal
 import asyncio
 from environs import Env
@@ -10,15 +9,18 @@ from loguru import logger
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from src import bitcoin_cli
+from src import bitcoin_cli, metrics
 from src.log import setup_logging
 
 setup_logging()
 
 from src.main import handle_event
-from src.data.processer.pgsql import Pgsql as DataProcesser
+from src import scheduler, shard, prevalidate
+from src.data.processer.pgsql import Pgsql
+from src.data.processer.cache import BlockStateCache
 from src.alert import send_alert
 from src.data.event.event import EventIndexer
+from src.data.snapshot import reader as snapshot_reader
 
 
 class Run:
@@ -33,22 +35,48 @@ class Run:
         self.indexer = indexer
         self.set_signal()
 
-        self.data_processer = DataProcesser()
+        env = Env()
+        env.read_env()
+
+        self.data_processer = self.create_data_processer(env.str("DATA_PROCESSER", "pgsql"))
+        self.block_state = BlockStateCache(self.data_processer)
         self.stop_flag = False
         self.close_flag = False
 
-        env = Env()
-        env.read_env()
         self.start_block_height = env.int("CORE_START_BLOCK_HEIGHT")
+        # seconds between two metrics reports, 0 disables them
+        self.metrics_report_interval = env.float("METRICS_REPORT_INTERVAL", 60)
 
         self.mempool_block_height = -1
         self.event_default_error = "not processed by indexer"
 
         self.default_block_confirmations = 6
         self.default_sleep_seconds = 10
+        # blocks whose events are fetched ahead of the one being handled
+        self.prefetch_blocks = env.int("PREFETCH_BLOCKS", 8)
+        # handle the events of a block that touch disjoint state concurrently
+        self.parallel_events = env.bool("PARALLEL_EVENTS", False)
+        # worker processes the events of a block are sharded across by tid, 0 disables it
+        self.shard_workers = env.int("SHARD_WORKERS", 0)
+        self.shard_executor = None
+        # worker processes checking the events that need no state, 0 disables it
+        self.prevalidate_workers = env.int("PREVALIDATE_WORKERS", 0)
+        self.prevalidate_executor = None
 
         self.event_indexer = None
 
+    def create_data_processer(self, name):
+        """
+        Create the data processer selected by the DATA_PROCESSER setting.
+        """
+        if name == "pgsql":
+            return Pgsql()
+        if name == "asyncpg":
+            from src.data.processer.pgsql_asyncpg import AsyncPgsql
+
+            return AsyncPgsql()
+        raise Exception(f"Run::create_data_processer: unknown data processer {name}")
+
     def set_signal(self):
         """
         Set the signal handlers for the Run object.
@@ -71,18 +99,31 @@ class Run:
         Initialize the data processer.
         """
         await self.data_processer.init()
+        if self.indexer == 'data' and self.shard_workers > 0:
+            self.shard_executor = shard.create_executor(self.shard_workers)
+        if self.indexer == 'data' and self.prevalidate_workers > 0:
+            self.prevalidate_executor = prevalidate.create_executor(self.prevalidate_workers)
+        if self.metrics_report_interval:
+            asyncio.create_task(metrics.report(self.metrics_report_interval))
 
     async def close(self):
         """
         Close the Redis connection and data processer.
         """
         await self.data_processer.close()
+        if self.shard_executor is not None:
+            self.shard_executor.shutdown()
+        if self.prevalidate_executor is not None:
+            self.prevalidate_executor.shutdown()
         await asyncio.sleep(3)
 
     async def load_snapshot(self):
         """
         Load the snapshot data into the database.
         """
+        # the state is rebuilt from scratch, nothing can be resumed until a block is applied
+        await self.data_processer.delete_backup_block_height()
+        await self.data_processer.mark_blocks_as_unapplied(self.start_block_height - 1)
         await self.data_processer.clear_all_tables()
         await self.data_processer.create_all_table()
 
@@ -90,32 +131,25 @@ class Run:
             os.path.join(os.path.dirname(__file__), "data/snapshot/")
         )
 
-        # Load tokens from tokens.json
-        with open(f"{data_path}/tokens.json", "r") as tokens_file:
-            tokens_json = json.load(tokens_file)
-
-        # Load holders from holders.json
-        with open(f"{data_path}/holders.json", "r") as holders_file:
-            holders_json = json.load(holders_file)
-
-        tokens = []
-        for token in tokens_json.values():
-            token["circulating"] = token["minted"]
-            tokens.append(token)
+        # Stream tokens from tokens.json
+        tokens = (
+            dict(token, circulating=token["minted"])
+            for _, token in snapshot_reader.iter_items(f"{data_path}/tokens.json")
+        )
 
         logger.info("saving tokens ...")
-        await self.data_processer.batch_save_tokens_in_dict(tokens)
-
-        holders = [
-            holder
-            for token_holders in holders_json.values()
-            for holder in token_holders
-        ]
-        for holder in holders:
-            holder["original_balance"] = holder["balance"]
+        await self.data_processer.bulk_load_tokens_in_dict(tokens)
+
+        # Stream holders from holders.json
+        holders = (
+            dict(holder, original_balance=holder["balance"])
+            for _, holder in snapshot_reader.iter_nested_items(
+                f"{data_path}/holders.json"
+            )
+        )
 
         logger.info("saving balances ...")
-        await self.data_processer.batch_save_balances_in_dict(holders)
+        await self.data_processer.bulk_load_balances_in_dict(holders)
 
         return
 
@@ -125,12 +159,13 @@ class Run:
         """
         return await bitcoin_cli.get_block_count()
 
-    async def handle_block(self, block_height, is_pending=False):
+    async def handle_block(self, block_height, is_pending=False, events=None):
         """
-        Handle the events in a block.
+        Handle the events in a block, fetching them unless they were prefetched.
         """
         try:
-            events = await self.data_processer.get_events_by_block_height(block_height)
+            if events is None:
+                events = await self.data_processer.get_events_by_block_height(block_height)
             if events is None:
                 logger.error(f"Failed to get events by block height: {block_height}")
                 self.stop_flag = True
@@ -138,16 +173,73 @@ class Run:
 
             logger.info(f"handling block: {block_height}, got {len(events)} events")
 
-            for event in events:
-                if is_pending is True and event.error != self.event_default_error:
-                    continue
-                await handle_event(event, self.data_processer, is_pending)
+            await self.block_state.begin_block(block_height)
+            if is_pending is False and self.prevalidate_executor is not None:
+                events = await prevalidate.filter_events(
+                    events,
+                    self.block_state,
+                    self.prevalidate_executor,
+                    self.prevalidate_workers,
+                )
+
+            if is_pending is False and self.shard_workers > 0:
+                await shard.handle_events(
+                    events, self.block_state, self.shard_executor, self.shard_workers
+                )
+            elif is_pending is False and self.parallel_events is True:
+                await scheduler.handle_events(events, self.block_state)
+            else:
+                for event in events:
+                    if is_pending is True and event.error != self.event_default_error:
+                        continue
+                    await handle_event(event, self.block_state, is_pending)
+            if is_pending is False:
+                await self.data_processer.mark_backup_block_height(block_height)
+                await self.data_processer.mark_block_applied(block_height)
+                await self.data_processer.prune_undo_logs(block_height)
+            await self.block_state.commit_block(block_height)
             return True
         except Exception as e:
+            await self.block_state.abort_block(block_height)
             error = f"Failed to handle block: {block_height}, {e}"
             logger.exception(error)
             return False
 
+    async def prefetch_events(self, start_block_height, end_block_height, queue):
+        """
+        Fetch the events of a range of blocks ahead of `handle_block`, in order.
+
+        The whole range is streamed by one cursor and split per block. The queue is
+        bounded, so at most `prefetch_blocks` blocks are read ahead. If the stream fails,
+        the remaining blocks are queued without events and fetched again when handled.
+        The stream is closed when the prefetch is cancelled, releasing its connection.
+        """
+        block_height = start_block_height
+        events = []
+        stream = self.data_processer.get_events_by_block_range(
+            start_block_height, end_block_height
+        )
+        try:
+            async for event in stream:
+                while block_height < event.block_height:
+                    await queue.put((block_height, events))
+                    block_height += 1
+                    events = []
+                events.append(event)
+        except Exception as e:
+            logger.error(f"Failed to prefetch events from block {block_height}: {e}")
+            for block_height in range(block_height, end_block_height):
+                await queue.put((block_height, None))
+            return
+        finally:
+            # once cancelled the stream is left suspended on its connection and cursor
+            await stream.aclose()
+
+        while block_height < end_block_height:
+            await queue.put((block_height, events))
+            block_height += 1
+            events = []
+
     async def reprocess_block(self, block_height):
         """
         Reprocess a block and its previous blocks.
@@ -187,6 +279,23 @@ class Run:
 
         return
 
+    async def rollback(self, block_height):
+        """
+        Roll the state back to a block height with the undo logs.
+
+        Returns:
+            The next block height to handle, or None if the undo logs are not deep enough
+            and the indexer has to restart from the snapshot.
+        """
+        if block_height >= self.start_block_height - 1 and await self.block_state.rollback_to_block(block_height):
+            logger.info(f"Rolled back to block {block_height}")
+            return block_height + 1
+
+        logger.info(f"Reorg is deeper than the undo logs, restart from beginning ...")
+        await self.data_processer.delete_backup_block_height()
+        self.stop_flag = True
+        return None
+
     async def start_event_indexer(self, init_block_height):
         if self.event_indexer:
             await self.event_indexer.stop()
@@ -198,23 +307,53 @@ class Run:
         """
         Run the main execution loop.
         """
-        logger.info("loading snapshot ...")
-        await self.load_snapshot()
-        logger.info("snapshot loaded")
-
-        current_block_height = self.start_block_height
+        await self.data_processer.init_backup_height_table()
+        await self.data_processer.init_undo_log_table()
+        await self.data_processer.init_event_table()
+        await self.data_processer.init_block_status_table()
+        last_block_height = await self.data_processer.get_backup_block_height()
+        if last_block_height is None:
+            logger.info("loading snapshot ...")
+            await self.load_snapshot()
+            logger.info("snapshot loaded")
+
+            current_block_height = self.start_block_height
+        else:
+            current_block_height = last_block_height + 1
+            logger.info(f"resume from block {current_block_height}")
 
         while not self.stop_flag:
             max_event_block = await self.data_processer.get_max_event_block()
             if max_event_block is None or current_block_height - 1 == max_event_block:
                 await self.handle_block(self.mempool_block_height, True)
                 logger.info(f"Waiting for new block events ...")
-                await asyncio.sleep(self.default_sleep_seconds)
+                # woken up by the event indexer, polling stays as the fallback
+                try:
+                    block_height = await self.data_processer.wait_block_events(
+                        self.default_sleep_seconds, after=current_block_height - 1
+                    )
+                    if block_height is not None:
+                        logger.info(f"Notified of block {block_height} events")
+                except Exception:
+                    await asyncio.sleep(self.default_sleep_seconds)
                 continue
             if current_block_height > max_event_block:  # reorg detected
-                logger.info(f"Reorg detected, restart from beginning ...")
-                self.stop_flag = True
-                break
+                logger.info(f"Reorg detected, roll back to block {max_event_block} ...")
+                current_block_height = await self.rollback(max_event_block)
+                if current_block_height is None:
+                    break
+                continue
+
+            min_unhandled_block = await self.data_processer.get_min_unhandled_block_height()
+            if (
+                min_unhandled_block is not None
+                and self.start_block_height <= min_unhandled_block < current_block_height
+            ):  # handled blocks were produced again
+                logger.info(f"Reorg detected, roll back to block {min_unhandled_block - 1} ...")
+                current_block_height = await self.rollback(min_unhandled_block - 1)
+                if current_block_height is None:
+                    break
+                continue
 
             if current_block_height == max_event_block:
                 if not await self.data_processer.is_block_handled(current_block_height):  # 可以处理了
@@ -228,12 +367,21 @@ class Run:
                 break
 
             start_block = current_block_height
-            for block in range(start_block, max_event_block):
-                current_block_height = block
-                logger.info(f"Handle block {current_block_height}")
-                if not await self.handle_block(current_block_height):
-                    self.stop_flag = True
-                    break
+            queue = asyncio.Queue(maxsize=self.prefetch_blocks)
+            prefetcher = asyncio.create_task(
+                self.prefetch_events(start_block, max_event_block, queue)
+            )
+            try:
+                for block in range(start_block, max_event_block):
+                    current_block_height = block
+                    _, events = await queue.get()
+                    logger.info(f"Handle block {current_block_height}")
+                    if not await self.handle_block(current_block_height, events=events):
+                        self.stop_flag = True
+                        break
+            finally:
+                prefetcher.cancel()
+                await asyncio.gather(prefetcher, return_exceptions=True)
 
             if self.stop_flag:
                 break
@@ -253,6 +401,9 @@ class Run:
             await self.close()
             logger.info("Data indexer stopped!")
         elif self.indexer == 'event':
+            await self.data_processer.init_event_table()
+            await self.data_processer.init_block_status_table()
+            await self.data_processer.init_orc20_inscription_table()
             while not self.close_flag:
                 start_block_height = self.start_block_height
                 max_event_block = await self.data_processer.get_max_event_block()
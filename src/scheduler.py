@@ -0,0 +1,231 @@
+import os
+import sys
+import asyncio
+from typing import List, Set, Union
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import register
+from src.storage import registered_handlers
+from src.structure import Event, EventType
+from src.indexer.core import mint as mint_indexer
+from src.indexer.core import burn as burn_indexer
+from src.indexer.core import transfer as transfer_indexer
+from src.indexer.core import upgrade as upgrade_indexer
+from src.indexer.otc import create as create_indexer
+from src.indexer.otc import buy as buy_indexer
+from src.main import handle_event
+from src.data.processer.interface import Interface as DataProcesser
+
+
+# the state touched by these ops is only known once other state has been read
+# (the otc's first token, the buyers of the records), so they run alone
+BARRIER = None
+
+
+def inscribe_keys(event: Event, parse_base_params) -> Set[tuple]:
+    (base_params, _) = parse_base_params(event)
+    if base_params is None:
+        return set()
+    return {("pending", event.receiver)}
+
+
+def deploy_keys(event: Event) -> Set[tuple]:
+    if event.event_type != EventType.INSCRIBE:
+        return set()
+    return {("token", event.inscription_number)}
+
+
+def mint_keys(event: Event) -> Set[tuple]:
+    if event.event_type != EventType.INSCRIBE:
+        return set()
+    (base_params, _) = mint_indexer.parse_base_params(event)
+    if base_params is None:
+        return set()
+    tid = base_params["tid"]
+    return {("token", tid), ("balance", event.receiver, tid)}
+
+
+def burn_keys(event: Event) -> Set[tuple]:
+    if event.event_type == EventType.INSCRIBE:
+        return inscribe_keys(event, burn_indexer.parse_base_params)
+    (base_params, _) = burn_indexer.parse_base_params(event)
+    if base_params is None:
+        return set()
+    tid = base_params["tid"]
+    return {("token", tid), ("balance", event.sender, tid), ("pending", event.sender)}
+
+
+def upgrade_keys(event: Event) -> Set[tuple]:
+    if event.event_type == EventType.INSCRIBE:
+        return inscribe_keys(event, upgrade_indexer.parse_base_params)
+    (base_params, _) = upgrade_indexer.parse_base_params(event)
+    if base_params is None:
+        return set()
+    return {("token", base_params["tid"]), ("pending", event.sender)}
+
+
+def transfer_keys(event: Event) -> Set[tuple]:
+    (base_params, _) = transfer_indexer.parse_base_params(event)
+    if base_params is None:
+        return set()
+    tid = base_params["tid"]
+    if event.event_type == EventType.INSCRIBE:
+        return {
+            ("token", tid),
+            ("pending", event.receiver),
+            ("balance", event.receiver, tid),
+        }
+    receiver = event.receiver if event.receiver != "" else event.sender
+    return {
+        ("token", tid),
+        ("pending", event.sender),
+        ("balance", event.sender, tid),
+        ("balance", receiver, tid),
+    }
+
+
+def otc_create_keys(event: Event) -> Set[tuple]:
+    if event.event_type == EventType.INSCRIBE:
+        return inscribe_keys(event, create_indexer.parse_base_params)
+    (base_params, _) = create_indexer.parse_base_params(event)
+    if base_params is None:
+        return set()
+    return {
+        ("pending", event.sender),
+        ("token", base_params["tid1"]),
+        ("token", base_params["tid2"]),
+        ("balance", event.sender, base_params["tid1"]),
+        ("otc", event.inscription_number),
+    }
+
+
+def otc_buy_keys(event: Event) -> Union[Set[tuple], None]:
+    if event.event_type == EventType.INSCRIBE:
+        return inscribe_keys(event, buy_indexer.parse_base_params)
+    return BARRIER
+
+
+def otc_execute_keys(event: Event) -> Union[Set[tuple], None]:
+    if event.event_type != EventType.INSCRIBE:
+        return set()
+    return BARRIER
+
+
+op_keys = {
+    "deploy": deploy_keys,
+    "mint": mint_keys,
+    "burn": burn_keys,
+    "upgrade": upgrade_keys,
+    "transfer": transfer_keys,
+    "otc-create": otc_create_keys,
+    "otc-buy": otc_buy_keys,
+    "otc-execute": otc_execute_keys,
+}
+
+
+def event_keys(event: Event) -> Union[Set[tuple], None]:
+    """
+    Derive the state an event may read or write when handled.
+
+    The checks of `handle_event` are replayed first, an event they reject touches no
+    state. Keys are ("token", tid), ("balance", address, tid), ("pending", address) and
+    ("otc", oid). Any key an event might touch is included, so two events without a
+    common key can be handled in any order.
+
+    Args:
+        event (Event): The event to inspect.
+
+    Returns:
+        Union[Set[tuple], None]: The keys of the event, None if it must run alone.
+    """
+    try:
+        content = event.content
+        for key in content.keys():
+            if key not in ["p", "op", "params"]:
+                return set()
+        if content.get("p", "").lower() != "orc-20":
+            return set()
+        op = content.get("op", "").lower()
+        if op == "" or op not in registered_handlers.keys():
+            return set()
+        if not content.get("params", {}):
+            return set()
+        if op not in op_keys:
+            return BARRIER
+        return op_keys[op](event)
+    except Exception:
+        # let the handler raise at the same point as a sequential run would
+        return BARRIER
+
+
+def build_dependencies(events: List[Event]) -> List[Set[int]]:
+    """
+    Build the dependency DAG of the events of a block.
+
+    An event depends on the last earlier event sharing one of its keys, so conflicting
+    events keep their block order. A barrier depends on every earlier event and every
+    later event depends on it.
+
+    Args:
+        events (List[Event]): The events of the block, in block order.
+
+    Returns:
+        List[Set[int]]: The indexes of the events each event must wait for.
+    """
+    dependencies = []
+    last_by_key = {}
+    since_barrier = []
+    barrier = None
+    for index, event in enumerate(events):
+        keys = event_keys(event)
+        if keys is BARRIER:
+            dependencies.append(
+                set(since_barrier) | ({barrier} if barrier is not None else set())
+            )
+            last_by_key = {}
+            since_barrier = []
+            barrier = index
+            continue
+
+        depends = {last_by_key[key] for key in keys if key in last_by_key}
+        if barrier is not None:
+            depends.add(barrier)
+        dependencies.append(depends)
+        for key in keys:
+            last_by_key[key] = index
+        since_barrier.append(index)
+    return dependencies
+
+
+async def handle_events(events: List[Event], data_processer: DataProcesser):
+    """
+    Handle the events of a block, running events without conflicts concurrently.
+
+    Each event starts once the events it depends on are handled, the state seen by each
+    handler is the same as in a sequential run.
+
+    Args:
+        events (List[Event]): The events of the block, in block order.
+        data_processer (DataProcesser): The data processer object.
+    """
+    dependencies = build_dependencies(events)
+    tasks = []
+
+    async def run(index: int):
+        if dependencies[index]:
+            await asyncio.gather(*(tasks[depend] for depend in dependencies[index]))
+        await handle_event(events[index], data_processer)
+
+    # every dependency is an earlier event, so its task exists before it is awaited
+    for index in range(len(events)):
+        tasks.append(asyncio.ensure_future(run(index)))
+
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # nothing may write to the block state once the block is aborted
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
@@ -0,0 +1,298 @@
+import os
+import sys
+import asyncio
+import contextvars
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+from loguru import logger
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src import scheduler, metrics
+from src.main import handle_event
+from src.structure import Event, Token, Balance, Pending_Inscriptions, OTC, OTC_Record
+from src.data.processer.cache import BlockStateCache
+from src.data.processer.interface import Interface as DataProcesser
+
+
+worker_loop = None
+
+
+def init_worker():
+    global worker_loop
+    worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(worker_loop)
+
+
+def create_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Create the pool of worker processes the shards are handled in.
+
+    Args:
+        workers (int): The number of worker processes.
+
+    Returns:
+        ProcessPoolExecutor: The pool.
+    """
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker)
+
+
+def components(events: List[Event], keys: List[set]) -> List[List[int]]:
+    """
+    Group the events sharing state, directly or through other events.
+
+    Args:
+        events (List[Event]): The events of the block, in block order.
+        keys (List[set]): The keys of each event.
+
+    Returns:
+        List[List[int]]: The indexes of the events of each group, in block order.
+    """
+    parents = list(range(len(events)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    owners = {}
+    for index, event_keys in enumerate(keys):
+        for key in event_keys:
+            if key in owners:
+                parents[find(index)] = find(owners[key])
+            else:
+                owners[key] = index
+
+    groups = {}
+    for index in range(len(events)):
+        groups.setdefault(find(index), []).append(index)
+    return list(groups.values())
+
+
+class NotPreloaded(Exception):
+    """
+    Raised in a worker when a handler reads a row the keys of its events did not predict.
+    """
+
+
+class Preloaded:
+    """
+    The data processer behind the block state cache of a shard, whose rows are all
+    preloaded, so any read reaching it is a row the keys missed.
+    """
+
+    async def get_token(self, tid):
+        raise NotPreloaded(f"shard: token {tid} is not preloaded")
+
+    async def get_balance(self, address, tid):
+        raise NotPreloaded(f"shard: balance {address}-{tid} is not preloaded")
+
+    async def get_pending_inscription(self, user):
+        raise NotPreloaded(f"shard: pending inscriptions of {user} are not preloaded")
+
+    async def get_otc(self, oid):
+        raise NotPreloaded(f"shard: otc {oid} is not preloaded")
+
+    async def get_otc_records(self, oid):
+        raise NotPreloaded(f"shard: records of otc {oid} are not preloaded")
+
+
+def detached(coro) -> asyncio.Task:
+    """
+    Run a read in a task outside the context of the block, so it takes a connection of
+    the pool instead of queueing on the connection of the block. Nothing of the block is
+    written to the database before it commits, so both see the same rows.
+    """
+    return contextvars.Context().run(asyncio.ensure_future, coro)
+
+
+async def load_key(key: tuple, data_processer: DataProcesser, state: dict):
+    if key[0] == "token":
+        token = await data_processer.get_token(key[1])
+        state["token"][key[1]] = vars(token) if token is not None else None
+    elif key[0] == "balance":
+        balance = await data_processer.get_balance(key[1], key[2])
+        state["balance"][f"{key[1]}-{key[2]}"] = (
+            vars(balance) if balance is not None else None
+        )
+    elif key[0] == "pending":
+        pending_inscription = await data_processer.get_pending_inscription(key[1])
+        state["pending"][key[1]] = (
+            vars(pending_inscription) if pending_inscription is not None else None
+        )
+    elif key[0] == "otc":
+        otc, otc_records = await asyncio.gather(
+            data_processer.get_otc(key[1]), data_processer.get_otc_records(key[1])
+        )
+        state["otc"][key[1]] = vars(otc) if otc is not None else None
+        state["otc_record"][key[1]] = [
+            vars(otc_record) for otc_record in otc_records or []
+        ]
+
+
+async def load_state(keys: set, data_processer: DataProcesser) -> dict:
+    """
+    Read every row a group of events may touch, as dicts that can cross processes.
+    """
+    state = {"token": {}, "balance": {}, "pending": {}, "otc": {}, "otc_record": {}}
+    await asyncio.gather(
+        *(detached(load_key(key, data_processer, state)) for key in keys)
+    )
+    return state
+
+
+def handle_shard(events: List[dict], state: dict) -> dict:
+    """
+    Handle the events of a shard in a worker process.
+
+    The handlers run against a block state cache seeded with every row the events may
+    touch, so they never reach the database; a read of any other row raises
+    `NotPreloaded`.
+
+    Args:
+        events (List[dict]): The events of the shard, in block order, as `vars(event)`.
+        state (dict): The rows loaded by `load_state`.
+
+    Returns:
+        dict: The handled events and every row they saved, as dicts.
+    """
+    return worker_loop.run_until_complete(handle_shard_events(events, state))
+
+
+async def handle_shard_events(events: List[dict], state: dict) -> dict:
+    cache = BlockStateCache(Preloaded())
+    cache.tokens = {
+        key: Token(**value) if value is not None else None
+        for key, value in state["token"].items()
+    }
+    cache.balances = {
+        key: Balance(**value) if value is not None else None
+        for key, value in state["balance"].items()
+    }
+    cache.pending_inscriptions = {
+        key: Pending_Inscriptions(**value) if value is not None else None
+        for key, value in state["pending"].items()
+    }
+    cache.otcs = {
+        key: OTC(**value) if value is not None else None
+        for key, value in state["otc"].items()
+    }
+    cache.otc_records = {
+        key: {value["id"]: OTC_Record(**value) for value in values}
+        for key, values in state["otc_record"].items()
+    }
+
+    handled_events = [Event(**event) for event in events]
+    for event in handled_events:
+        await handle_event(event, cache)
+
+    return {
+        "events": [vars(event) for event in handled_events],
+        "tokens": [vars(cache.tokens[key]) for key in cache.dirty_tokens],
+        "balances": [vars(cache.balances[key]) for key in cache.dirty_balances],
+        "pending_inscriptions": [
+            vars(cache.pending_inscriptions[key])
+            for key in cache.dirty_pending_inscriptions
+        ],
+        "otcs": [vars(cache.otcs[key]) for key in cache.dirty_otcs],
+        "otc_records": [
+            vars(otc_record) for otc_record in cache.saved_otc_records.values()
+        ],
+    }
+
+
+async def handle_events(
+    events: List[Event],
+    data_processer: DataProcesser,
+    executor: ProcessPoolExecutor,
+    shards: int,
+):
+    """
+    Handle the events of a block across worker processes.
+
+    Events are grouped by the state they share and each group goes to the shard of its
+    smallest tid; groups without a tid stay in this process and run once the shards are
+    done. Blocks holding an event that must run alone are handled in this process
+    entirely, and so are blocks where a handler read a row the keys of its events did
+    not predict, counted in the `shard.fallbacks` metric.
+
+    Args:
+        events (List[Event]): The events of the block, in block order.
+        data_processer (DataProcesser): The block state the results are saved to.
+        executor (ProcessPoolExecutor): The pool of worker processes.
+        shards (int): The number of shards.
+    """
+    keys = [scheduler.event_keys(event) for event in events]
+    if any(event_keys is scheduler.BARRIER for event_keys in keys):
+        await scheduler.handle_events(events, data_processer)
+        return
+
+    shard_indexes = {}
+    local_indexes = []
+    for group in components(events, keys):
+        tids = [
+            key[-1] if key[0] == "balance" else key[1]
+            for index in group
+            for key in keys[index]
+            if key[0] in ("token", "balance")
+        ]
+        if not tids:
+            local_indexes.extend(group)
+            continue
+        shard_indexes.setdefault(min(tids) % shards, []).extend(group)
+
+    loop = asyncio.get_running_loop()
+    groups = [sorted(indexes) for indexes in shard_indexes.values()]
+    states = await asyncio.gather(
+        *(
+            load_state(set().union(*(keys[index] for index in indexes)), data_processer)
+            for indexes in groups
+        )
+    )
+    results = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor,
+                handle_shard,
+                [vars(events[index]) for index in indexes],
+                state,
+            )
+            for indexes, state in zip(groups, states)
+        ),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, NotPreloaded):
+            # nothing of the shards is saved yet, the block is handled again in this process
+            logger.warning(f"{result}, handle the block in process")
+            metrics.incr("shard.fallbacks")
+            await scheduler.handle_events(events, data_processer)
+            return
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    local_indexes.sort()
+    await scheduler.handle_events(
+        [events[index] for index in local_indexes], data_processer
+    )
+    for result in results:
+        await data_processer.batch_save_tokens(
+            [Token(**token) for token in result["tokens"]]
+        )
+        await data_processer.batch_save_balances(
+            [Balance(**balance) for balance in result["balances"]]
+        )
+        await data_processer.batch_save_pending_inscriptions(
+            [
+                Pending_Inscriptions(**pending_inscription)
+                for pending_inscription in result["pending_inscriptions"]
+            ]
+        )
+        await data_processer.batch_save_otcs([OTC(**otc) for otc in result["otcs"]])
+        await data_processer.batch_save_otc_records(
+            [OTC_Record(**otc_record) for otc_record in result["otc_records"]]
+        )
+        await data_processer.save_events([Event(**event) for event in result["events"]])
@@ -5,6 +5,18 @@ from .pending_inscriptions import Pending_Inscriptions
 from .otc_record import OTC_Record
 from .otc import OTC
 from .backup_height import Backup_Height
+from .undo_log import Undo_Log
+from .block_status import Block_Status
+from .instruction import (
+    Deploy_Instruction,
+    Mint_Instruction,
+    Burn_Instruction,
+    Transfer_Instruction,
+    Upgrade_Instruction,
+    OTC_Create_Instruction,
+    OTC_Buy_Instruction,
+    OTC_Execute_Instruction,
+)
 from .inscription import Inscription
 from .inscription_transaction import Inscription_Transaction
 from .brc20_token_ledger_log import Brc20_Token_Ledger_Log
@@ -0,0 +1,31 @@
+from typing import Union
+
+
+class Block_Status:
+    """
+    Represents the progress of both indexers on a block.
+
+    Attributes:
+        id (int): The height of the block.
+        event_count (int): The number of events the event indexer produced for the block.
+        produced (bool): Whether the event indexer committed the events of the block.
+        applied (bool): Whether the data indexer applied the events of the block.
+        produced_time (int): When the events were produced, in seconds since the epoch.
+        applied_time (int, optional): When the events were applied, in seconds since the epoch.
+    """
+
+    def __init__(
+        self,
+        id: int,
+        event_count: int,
+        produced: bool,
+        applied: bool,
+        produced_time: int,
+        applied_time: Union[int, None] = None,
+    ) -> None:
+        self.id = id
+        self.event_count = event_count
+        self.produced = produced
+        self.applied = applied
+        self.produced_time = produced_time
+        self.applied_time = applied_time
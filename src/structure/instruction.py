@@ -0,0 +1,142 @@
+from decimal import Decimal
+from typing import NamedTuple, Union
+
+
+class Deploy_Instruction(NamedTuple):
+    """
+    The parsed parameters of a deploy inscription.
+
+    Attributes:
+        tick (str): The tick of the token.
+        dec (int): The number of decimals of the token.
+        max (Decimal): The max supply of the token.
+        lim (Decimal): The mint limit of the token.
+        ug (bool): Whether the token is upgradable.
+        mp (bool): Whether minting is protected.
+    """
+
+    tick: str
+    dec: int
+    max: Decimal
+    lim: Decimal
+    ug: bool
+    mp: bool
+
+
+class Mint_Instruction(NamedTuple):
+    """
+    The parsed parameters of a mint inscription.
+
+    Attributes:
+        tick (str): The tick of the token.
+        tid (int): The id of the token.
+        amt (Decimal): The amount to mint.
+    """
+
+    tick: str
+    tid: int
+    amt: Decimal
+
+
+class Burn_Instruction(NamedTuple):
+    """
+    The parsed parameters of a burn inscription.
+
+    Attributes:
+        tick (str): The tick of the token.
+        tid (int): The id of the token.
+        amt (Decimal): The amount to burn.
+    """
+
+    tick: str
+    tid: int
+    amt: Decimal
+
+
+class Transfer_Instruction(NamedTuple):
+    """
+    The parsed parameters of a transfer inscription.
+
+    Attributes:
+        tick (str): The tick of the token.
+        tid (int): The id of the token.
+        amt (Decimal): The amount to transfer.
+    """
+
+    tick: str
+    tid: int
+    amt: Decimal
+
+
+class Upgrade_Instruction(NamedTuple):
+    """
+    The parsed parameters of an upgrade inscription, None for what is left unchanged.
+
+    Attributes:
+        tick (str): The tick of the token.
+        tid (int): The id of the token.
+        max (Decimal, optional): The new max supply of the token.
+        lim (Decimal, optional): The new mint limit of the token.
+        ug (bool, optional): Whether the token stays upgradable.
+        mp (bool, optional): Whether minting is protected.
+    """
+
+    tick: str
+    tid: int
+    max: Union[Decimal, None]
+    lim: Union[Decimal, None]
+    ug: Union[bool, None]
+    mp: Union[bool, None]
+
+
+class OTC_Create_Instruction(NamedTuple):
+    """
+    The parsed parameters of an otc-create inscription.
+
+    Attributes:
+        tick1 (str): The tick of the token sold.
+        tid1 (int): The id of the token sold.
+        tick2 (str): The tick of the token received.
+        tid2 (int): The id of the token received.
+        supply (Decimal): The amount of the first token sold.
+        er (Decimal): The exchange rate.
+        dl (int): The deadline of the otc.
+        mba (Decimal): The minimum buy amount.
+    """
+
+    tick1: str
+    tid1: int
+    tick2: str
+    tid2: int
+    supply: Decimal
+    er: Decimal
+    dl: int
+    mba: Decimal
+
+
+class OTC_Buy_Instruction(NamedTuple):
+    """
+    The parsed parameters of an otc-buy inscription.
+
+    Attributes:
+        tick (str): The tick of the token paid.
+        tid (int): The id of the token paid.
+        oid (int): The id of the otc.
+        amt (Decimal): The amount paid.
+    """
+
+    tick: str
+    tid: int
+    oid: int
+    amt: Decimal
+
+
+class OTC_Execute_Instruction(NamedTuple):
+    """
+    The parsed parameters of an otc-execute inscription.
+
+    Attributes:
+        oid (int): The id of the otc.
+    """
+
+    oid: int
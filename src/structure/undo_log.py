@@ -0,0 +1,31 @@
+from typing import Union
+
+
+class Undo_Log:
+    """
+    Represents the image of a state row before a block changed it.
+
+    Attributes:
+        id (str): The unique identifier of the undo log, {block_height}-{seq}.
+        block_height (int): The height of the block that changed the row.
+        seq (int): The position of the undo log within the block.
+        table_name (str): The name of the table of the row.
+        row_id (str): The ID of the row.
+        image (dict, optional): The row before the block was applied, None if it did not exist.
+    """
+
+    def __init__(
+        self,
+        id: str,
+        block_height: int,
+        seq: int,
+        table_name: str,
+        row_id: str,
+        image: Union[dict, None],
+    ) -> None:
+        self.id = id
+        self.block_height = block_height
+        self.seq = seq
+        self.table_name = table_name
+        self.row_id = row_id
+        self.image = image